@@ -0,0 +1 @@
+"""Offline benchmarks for the SSH client, see benchmarks/run.py"""
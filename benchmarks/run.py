@@ -0,0 +1,375 @@
+"""Throughput benchmarks for SSHClient against an in-process SFTP server
+
+Run from the repository root:
+
+    python -m benchmarks.run                        # full matrix
+    python -m benchmarks.run --quick                # smaller matrix for a fast check
+    python -m benchmarks.run --compare old.json     # report changes against an earlier run
+
+Everything runs offline on 127.0.0.1, with scratch data in a temporary
+directory. Results are written as JSON, one record per benchmark case, so runs
+from different versions can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import paramiko
+from config import APP_VERSION
+from services import SSHClient
+from services.delta import SignatureStore
+from services.metadata_cache import MetadataCache
+from services.tuning import describe
+from .sftp_server import LocalSFTPServer
+
+KB = 1024
+MB = 1024 * 1024
+
+# Benchmark matrix; --quick uses the second set
+FILE_SIZES = [64 * KB, 1 * MB, 16 * MB, 128 * MB]
+FILE_COUNTS = [10, 100, 1000]
+CONCURRENCY = [1, 4, 8]
+QUICK_FILE_SIZES = [64 * KB, 1 * MB, 16 * MB]
+QUICK_FILE_COUNTS = [10, 100]
+QUICK_CONCURRENCY = [1, 4]
+
+SMALL_FILE_SIZE = 4 * KB  # Size of every file in the file count cases
+METADATA_OPERATIONS = 500  # Listings or stats per metadata case
+CONNECT_REPEATS = 5
+ROUNDS = 3  # Every case is timed this many times and the median is kept
+
+# Units where a lower value is better; everything else is a rate
+LOWER_IS_BETTER = {"ms"}
+
+
+class BenchmarkRun:
+    """One benchmark session against a fresh server and scratch directory"""
+    def __init__(self, work_dir, port, rounds=ROUNDS):
+        """Set up the local and remote scratch directories"""
+        self.work_dir = work_dir
+        self.port = port
+        self.rounds = rounds
+        self.local_dir = os.path.join(work_dir, "local")
+        self.remote_dir = os.path.join(work_dir, "remote")
+        os.makedirs(self.local_dir)
+        os.makedirs(self.remote_dir)
+        self.results = []
+        self._case = 0
+
+    def new_client(self, cache=True):
+        """A connected SSHClient; cache=False turns off metadata caching"""
+        client = SSHClient("127.0.0.1", self.port, "benchmark", "benchmark", self.remote_dir)
+        # Keep delta signatures with the scratch files instead of in the app directory
+        client.signatures = SignatureStore(os.path.join(self.work_dir, "sigs"))
+        if not cache:
+            client.cache = MetadataCache(0)
+        success, error = client.connect()
+        if not success:
+            raise RuntimeError(error)
+        return client
+
+    def record(self, name, params, value, unit, **extra):
+        """Store one result and print it"""
+        result = {"name": name, "params": params, "value": round(value, 3), "unit": unit}
+        result.update(extra)
+        self.results.append(result)
+        details = ", ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{name:<16} {details:<48} {value:>12.2f} {unit}", flush=True)
+
+    def connect_latency(self, repeats=CONNECT_REPEATS):
+        """Time from SSHClient.connect() to a usable connection, including tuning"""
+        samples = []
+        for _ in range(repeats):
+            client = SSHClient("127.0.0.1", self.port, "benchmark", "benchmark", self.remote_dir)
+            started = time.perf_counter()
+            success, error = client.connect()
+            samples.append(time.perf_counter() - started)
+            client.close()
+            if not success:
+                raise RuntimeError(error)
+
+        self.record(
+            "connect", {"repeats": repeats}, statistics.median(samples) * 1000, "ms",
+            min_ms=round(min(samples) * 1000, 3)
+        )
+
+    def transfer_throughput(self, client, file_size, concurrency):
+        """Upload and then download `concurrency` files of file_size at once"""
+        folder = self._new_folder()
+        source = self._write_local_file(f"source-{file_size}", file_size)
+
+        # Hard links give every worker its own file name without more disk space
+        local_paths = []
+        for index in range(concurrency):
+            path = os.path.join(self.local_dir, folder, f"file-{index}.bin")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.link(source, path)
+            local_paths.append(path)
+
+        params = {"file_size": file_size, "concurrency": concurrency}
+        seconds = self._timed(
+            concurrency, [lambda path=path: client.upload_file(path, folder) for path in local_paths],
+            reset=lambda: self._clear_remote(folder)
+        )
+        self._record_rates("upload", params, file_size * concurrency / MB, seconds, "MiB/s")
+
+        download_dir = os.path.join(self.local_dir, folder, "downloads")
+        os.makedirs(download_dir)
+        seconds = self._timed(
+            concurrency,
+            [lambda path=path: client.download_file(folder, os.path.basename(path), download_dir)
+             for path in local_paths]
+        )
+        self._record_rates("download", params, file_size * concurrency / MB, seconds, "MiB/s")
+
+        self._cleanup(folder)
+
+    def file_count_throughput(self, client, file_count, concurrency):
+        """Upload many small files one by one over `concurrency` workers"""
+        folder = self._new_folder()
+        local_paths = self._write_small_files(folder, file_count)
+
+        seconds = self._timed(
+            concurrency, [lambda path=path: client.upload_file(path, folder) for path in local_paths],
+            reset=lambda: self._clear_remote(folder)
+        )
+        self._record_rates(
+            "upload_files", {"file_count": file_count, "concurrency": concurrency}, file_count, seconds, "files/s"
+        )
+        self._cleanup(folder)
+
+    def archive_throughput(self, client, file_count):
+        """Upload many small files as one archive extracted on the server"""
+        folder = self._new_folder()
+        local_paths = self._write_small_files(folder, file_count)
+        client.create_folder(folder)
+
+        seconds = self._timed(
+            1, [lambda: client.upload_archive([(path, folder) for path in local_paths])],
+            reset=lambda: self._clear_remote(folder)
+        )
+        self._record_rates("upload_archive", {"file_count": file_count}, file_count, seconds, "files/s")
+        self._cleanup(folder)
+
+    def metadata_operations(self, clients, file_count, concurrency):
+        """Listing and stat operations per second, with and without the metadata cache"""
+        folder = self._new_folder()
+        remote_folder = os.path.join(self.remote_dir, folder)
+        os.makedirs(remote_folder)
+        names = [f"file-{index}.txt" for index in range(file_count)]
+        for name in names:
+            with open(os.path.join(remote_folder, name), "wb") as remote_file:
+                remote_file.write(b"x" * SMALL_FILE_SIZE)
+
+        for cached, client in clients.items():
+            params = {"file_count": file_count, "concurrency": concurrency, "cached": cached}
+
+            seconds = self._timed(
+                concurrency, [lambda: client.list_directory(folder) for _ in range(METADATA_OPERATIONS)]
+            )
+            self._record_rates("list_directory", params, METADATA_OPERATIONS, seconds, "ops/s")
+
+            seconds = self._timed(
+                concurrency,
+                [lambda name=names[index % file_count]: client.get_file_info(folder, name)
+                 for index in range(METADATA_OPERATIONS)]
+            )
+            self._record_rates("stat", params, METADATA_OPERATIONS, seconds, "ops/s")
+
+        self._cleanup(folder)
+
+    def _timed(self, concurrency, operations, reset=None):
+        """Time the operations once per round; reset() runs between rounds"""
+        seconds = []
+        for round_number in range(self.rounds):
+            if reset and round_number:
+                reset()
+            seconds.append(self._run_parallel(concurrency, operations))
+        return seconds
+
+    def _record_rates(self, name, params, amount, seconds, unit):
+        """Record amount per second for the median round, with the spread between rounds"""
+        rates = sorted(amount / elapsed for elapsed in seconds)
+        self.record(
+            name, params, statistics.median(rates), unit,
+            min=round(rates[0], 3), max=round(rates[-1], 3), rounds=len(rates)
+        )
+
+    def _run_parallel(self, concurrency, operations):
+        """Run (result, error) operations on `concurrency` threads and time them"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(lambda operation: operation(), operations))
+        seconds = time.perf_counter() - started
+
+        errors = [error for _, error in outcomes if error]
+        if errors:
+            raise RuntimeError(f"{len(errors)} operation(s) failed, first: {errors[0]}")
+        return max(seconds, 1e-9)
+
+    def _new_folder(self):
+        """Name of a fresh folder for one benchmark case"""
+        self._case += 1
+        return f"case-{self._case}"
+
+    def _write_local_file(self, name, size):
+        """Create a local file of random data"""
+        path = os.path.join(self.local_dir, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as local_file:
+                remaining = size
+                while remaining > 0:
+                    block = os.urandom(min(MB, remaining))
+                    local_file.write(block)
+                    remaining -= len(block)
+        return path
+
+    def _write_small_files(self, folder, file_count):
+        """Create file_count small local files of random data"""
+        directory = os.path.join(self.local_dir, folder)
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for index in range(file_count):
+            path = os.path.join(directory, f"file-{index}.txt")
+            with open(path, "wb") as local_file:
+                local_file.write(os.urandom(SMALL_FILE_SIZE))
+            paths.append(path)
+        return paths
+
+    def _clear_remote(self, folder):
+        """Delete the files a round uploaded, so the next round starts from scratch"""
+        remote_folder = os.path.join(self.remote_dir, folder)
+        with os.scandir(remote_folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    os.remove(entry.path)
+
+    def _cleanup(self, folder):
+        """Remove a case's local and remote data"""
+        shutil.rmtree(os.path.join(self.local_dir, folder), ignore_errors=True)
+        shutil.rmtree(os.path.join(self.remote_dir, folder), ignore_errors=True)
+
+
+def run_benchmarks(quick=False, rounds=ROUNDS):
+    """Run the whole matrix and return the JSON document"""
+    file_sizes = QUICK_FILE_SIZES if quick else FILE_SIZES
+    file_counts = QUICK_FILE_COUNTS if quick else FILE_COUNTS
+    concurrency_levels = QUICK_CONCURRENCY if quick else CONCURRENCY
+
+    server = LocalSFTPServer()
+    port = server.start()
+    work_dir = tempfile.mkdtemp(prefix="sftp-benchmark-")
+    try:
+        run = BenchmarkRun(work_dir, port, rounds)
+        run.connect_latency()
+
+        client = run.new_client()
+        uncached_client = run.new_client(cache=False)
+        profile = describe(client.tuning)
+        try:
+            for file_size in file_sizes:
+                for concurrency in concurrency_levels:
+                    run.transfer_throughput(client, file_size, concurrency)
+
+            for file_count in file_counts:
+                for concurrency in concurrency_levels:
+                    run.file_count_throughput(client, file_count, concurrency)
+                run.archive_throughput(client, file_count)
+
+            for file_count in file_counts:
+                for concurrency in concurrency_levels:
+                    run.metadata_operations({True: client, False: uncached_client}, file_count, concurrency)
+        finally:
+            client.close()
+            uncached_client.close()
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "version": APP_VERSION,
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "quick": quick,
+        "rounds": rounds,
+        "python": platform.python_version(),
+        "paramiko": paramiko.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "profile": profile,
+        "results": run.results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print the change of every case present in both runs; returns the regressions"""
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    earlier = {key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"\nChanges since {baseline.get('commit') or baseline.get('created_at')}:")
+    for result in current["results"]:
+        before = earlier.get(key(result))
+        if not before or not before["value"]:
+            continue
+
+        change = (result["value"] - before["value"]) / before["value"]
+        if result["unit"] in LOWER_IS_BETTER:
+            change = -change
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(result)
+
+        details = ", ".join(f"{name}={value}" for name, value in result["params"].items())
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{result['name']:<16} {details:<48} {change:>+8.1%}{marker}")
+    return regressions
+
+
+def _git_commit():
+    """Commit hash of the tree under test, if it is a git checkout"""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return output.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Benchmark SSHClient against a local SFTP server")
+    parser.add_argument("--quick", action="store_true", help="run a smaller matrix")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help=f"timed rounds per case (default {ROUNDS})")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default 0.1)")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    results = run_benchmarks(quick=args.quick, rounds=max(1, args.rounds))
+    with open(output_path, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"\nResults written to {output_path}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""In-process SFTP/SSH server used as a stand-in for the real host in benchmarks
+
+It serves a local directory over SFTP and runs exec requests through the local
+POSIX shell, so SSHClient takes its POSIX code paths (sha256sum, cp, mkdir -p,
+tar). Any password is accepted; it only listens on 127.0.0.1.
+"""
+import os
+import socket
+import subprocess
+import threading
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, ServerInterface
+from paramiko import SFTP_OK, AUTH_SUCCESSFUL, OPEN_SUCCEEDED
+
+
+def _sftp_errors(method):
+    """Turn OSErrors raised by a server method into SFTP status codes"""
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+    return wrapper
+
+
+class LocalHandle(SFTPHandle):
+    """Open local file behind an SFTP handle"""
+    @_sftp_errors
+    def stat(self):
+        """Attributes of the open file"""
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    @_sftp_errors
+    def chattr(self, attr):
+        """Truncate or extend the open file"""
+        if attr.st_size is not None:
+            os.ftruncate(self.readfile.fileno(), attr.st_size)
+        return SFTP_OK
+
+
+class LocalSFTP(SFTPServerInterface):
+    """SFTP operations mapped straight onto the local filesystem"""
+    @_sftp_errors
+    def list_folder(self, path):
+        """Entries of a directory with their attributes"""
+        entries = []
+        with os.scandir(path) as scan:
+            for entry in scan:
+                attr = SFTPAttributes.from_stat(entry.stat())
+                attr.filename = entry.name
+                entries.append(attr)
+        return entries
+
+    @_sftp_errors
+    def stat(self, path):
+        """Attributes of a path"""
+        return SFTPAttributes.from_stat(os.stat(path))
+
+    @_sftp_errors
+    def lstat(self, path):
+        """Attributes of a path without following symlinks"""
+        return SFTPAttributes.from_stat(os.lstat(path))
+
+    @_sftp_errors
+    def open(self, path, flags, attr):
+        """Open a file with the client's POSIX flags"""
+        fd = os.open(path, flags, 0o644)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+
+        handle = LocalHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    @_sftp_errors
+    def remove(self, path):
+        """Delete a file"""
+        os.remove(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def rename(self, old_path, new_path):
+        """Plain SFTP rename, which fails if the target exists"""
+        if os.path.exists(new_path):
+            raise FileExistsError(17, "File exists")
+        os.rename(old_path, new_path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def posix_rename(self, old_path, new_path):
+        """posix-rename@openssh.com, which replaces the target"""
+        os.replace(old_path, new_path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def mkdir(self, path, attr):
+        """Create a directory"""
+        os.mkdir(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def rmdir(self, path):
+        """Remove an empty directory"""
+        os.rmdir(path)
+        return SFTP_OK
+
+    @_sftp_errors
+    def chattr(self, path, attr):
+        """Truncate or extend a file"""
+        if attr.st_size is not None:
+            os.truncate(path, attr.st_size)
+        return SFTP_OK
+
+
+class LocalServer(ServerInterface):
+    """Accepts any password and runs exec requests in the local shell"""
+    def check_auth_password(self, username, password):
+        """Let every login in"""
+        return AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        """Only password authentication is offered"""
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        """Allow session channels"""
+        return OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        """Run the command in the background and send its output and exit status"""
+        def run():
+            result = subprocess.run(command.decode(), shell=True, capture_output=True)
+            channel.sendall(result.stdout)
+            channel.sendall_stderr(result.stderr)
+            channel.send_exit_status(result.returncode)
+            channel.close()
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class LocalSFTPServer:
+    """Listen on a free local port and serve SFTP until stopped"""
+    def __init__(self):
+        """Generate a host key and bind the listening socket"""
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen(64)
+        self.port = self.socket.getsockname()[1]
+        self._transports = []
+        self._thread = None
+
+    def start(self):
+        """Accept connections on a background thread"""
+        self._thread = threading.Thread(target=self._accept, name="sftp-server", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Stop listening and close every connection"""
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        for transport in self._transports:
+            transport.close()
+
+    def _accept(self):
+        """Hand every incoming connection to its own paramiko transport"""
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return  # Socket closed by stop()
+
+            transport = paramiko.Transport(connection)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, LocalSFTP)
+            transport.start_server(server=LocalServer())
+            self._transports.append(transport)
@@ -16,11 +16,49 @@ APP_NAME = "SSH File Manager"
 APP_VERSION = "1.0.0"
 DB_NAME = "ssh_manager.db"
 
+# Database configuration
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", 16 * 1024))  # KiB of page cache per connection
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", 10.0))  # Seconds a write waits for another thread's write
+DB_STATEMENT_CACHE = 256  # Prepared statements kept per connection
+
 # UI configuration
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
 THEME = "clam"  # Options: 'clam', 'alt', 'default', 'classic'
 
+# Transfer configuration
+CHUNKED_UPLOAD_THRESHOLD = int(os.getenv("CHUNKED_UPLOAD_THRESHOLD", 64 * 1024 * 1024))  # Bytes
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 8 * 1024 * 1024))  # Bytes per byte range with the default profile
+TRANSFER_PROFILE = os.getenv("TRANSFER_PROFILE", "auto")  # Options: 'auto', 'lan', 'wan', 'satellite', 'default'
+UPLOAD_CHANNELS = int(os.getenv("UPLOAD_CHANNELS", 4))  # Parallel SFTP channels per chunked upload
+CHUNKED_DOWNLOAD_THRESHOLD = int(os.getenv("CHUNKED_DOWNLOAD_THRESHOLD", 64 * 1024 * 1024))  # Bytes
+DOWNLOAD_CHANNELS = int(os.getenv("DOWNLOAD_CHANNELS", 4))  # Parallel SFTP channels per ranged download
+TRANSFER_WORKERS = int(os.getenv("TRANSFER_WORKERS", 4))  # Files uploaded at once by the transfer queue
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", 4))  # Worker threads each for interactive work and for downloads
+SFTP_POOL_SIZE = int(os.getenv("SFTP_POOL_SIZE", 8))  # Most SFTP channels open at once
+SFTP_POOL_MIN_IDLE = int(os.getenv("SFTP_POOL_MIN_IDLE", 2))  # Channels kept open and ready in the background
+SFTP_RESERVED_INTERACTIVE = int(os.getenv("SFTP_RESERVED_INTERACTIVE", 2))  # Channels only previews and listings may use
+INTERACTIVE_BANDWIDTH_CAP = int(os.getenv("INTERACTIVE_BANDWIDTH_CAP", 0))  # Bytes/second for previews, 0 for no cap
+NORMAL_BANDWIDTH_CAP = int(os.getenv("NORMAL_BANDWIDTH_CAP", 0))  # Bytes/second for downloads, 0 for no cap
+BULK_BANDWIDTH_CAP = int(os.getenv("BULK_BANDWIDTH_CAP", 0))  # Bytes/second for queued uploads, 0 for no cap
+SSH_TRANSPORTS = int(os.getenv("SSH_TRANSPORTS", 1))  # SSH connections the SFTP channels are spread over
+KEEPALIVE_INTERVAL = int(os.getenv("KEEPALIVE_INTERVAL", 30))  # Seconds between keepalives and health checks
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", 60))  # Seconds remote listings and stats stay cached
+TRANSFER_RETRIES = int(os.getenv("TRANSFER_RETRIES", 3))  # Retries per chunk before a transfer fails
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 1.0))  # Seconds before the first retry, doubled each time
+VERIFY_UPLOADS = os.getenv("VERIFY_UPLOADS", "true").lower() == "true"  # Compare SHA-256 with the server after upload
+DELTA_MIN_SIZE = int(os.getenv("DELTA_MIN_SIZE", 4 * 1024 * 1024))  # Smallest file re-uploaded as a delta
+DELTA_BLOCK_SIZE = 32 * 1024  # Block size of delta signatures
+DELTA_MAX_CHANGED = float(os.getenv("DELTA_MAX_CHANGED", 0.5))  # Share of changed bytes that switches to a full upload
+SIGNATURE_DIR = "signatures"  # Local cache of block signatures for uploaded files
+COMPRESSION_MODE = os.getenv("COMPRESSION_MODE", "auto")  # Options: 'auto', 'always', 'never'
+COMPRESSION_MIN_RATIO = float(os.getenv("COMPRESSION_MIN_RATIO", 1.5))  # Sampled ratio needed to compress
+COMPRESSION_MIN_SIZE = 256 * 1024  # Smaller files aren't worth a second transport
+ARCHIVE_FILE_MAX_SIZE = int(os.getenv("ARCHIVE_FILE_MAX_SIZE", 1024 * 1024))  # Files up to this size may be batched
+ARCHIVE_MIN_FILES = int(os.getenv("ARCHIVE_MIN_FILES", 20))  # Fewer small files are uploaded one by one
+ARCHIVE_MAX_FILES = 1000  # Files per archive, bounds the work redone when one fails
+ARCHIVE_MAX_BYTES = 128 * 1024 * 1024  # Bytes per archive
+
 # Validate required configuration
 def validate_config():
     """Validate that all required configuration variables are set"""
@@ -6,8 +6,9 @@ import os
 from config import validate_config, SSH_HOST, SSH_PORT, SSH_USER, SSH_PASSWORD, REMOTE_DIR, DB_NAME
 from config import APP_NAME, APP_VERSION, WINDOW_WIDTH, WINDOW_HEIGHT, THEME
 from models import DatabaseManager
-from services import SSHClient
-from ui import UploadView, BrowseView, center_window
+from services import SSHClient, AsyncSSHClient, MetricsRecorder
+from services.tuning import describe
+from ui import UploadView, BrowseView, AnalyticsView, TkBridge, center_window
 
 class MainApplication(tk.Tk):
     """Main application window"""
@@ -39,6 +40,14 @@ class MainApplication(tk.Tk):
             remote_dir=REMOTE_DIR
         )
         
+        # Record how long transfers and listings take
+        self.metrics = MetricsRecorder(self.db_manager)
+        self.ssh_client.metrics = self.metrics
+        
+        # Remote operations shared by all views run in the background
+        self.async_client = AsyncSSHClient(self.ssh_client)
+        self.bridge = TkBridge(self)
+        
         # Set up ttk style
         self._setup_style()
         
@@ -80,26 +89,43 @@ class MainApplication(tk.Tk):
         self.browse_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.browse_frame, text="Browse Files")
         
+        # Analytics tab
+        self.analytics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.analytics_frame, text="Analytics")
+        
         # Initialize views
         self.upload_view = UploadView(
             self.upload_frame, 
             self.ssh_client, 
             self.db_manager,
-            on_refresh_callback=self._on_upload_refresh
+            on_refresh_callback=self._on_upload_refresh,
+            async_client=self.async_client
         )
         self.upload_view.pack(fill=tk.BOTH, expand=True)
         
         self.browse_view = BrowseView(
             self.browse_frame, 
             self.ssh_client, 
-            self.db_manager
+            self.db_manager,
+            async_client=self.async_client
         )
         self.browse_view.pack(fill=tk.BOTH, expand=True)
+        
+        self.analytics_view = AnalyticsView(
+            self.analytics_frame,
+            self.db_manager,
+            metrics=self.metrics,
+            cache=self.ssh_client.cache
+        )
+        self.analytics_view.pack(fill=tk.BOTH, expand=True)
     
     def _init_connection(self):
         """Initialize connection and refresh folder list"""
-        # Try to connect
-        success, error = self.ssh_client.connect()
+        # Try to connect without blocking the window
+        self.bridge.watch(self.async_client.connect(), self._on_connected)
+    
+    def _on_connected(self, success, error):
+        """Fetch the folder list once connected"""
         if not success:
             messagebox.showwarning(
                 "Connection Warning",
@@ -107,10 +133,17 @@ class MainApplication(tk.Tk):
             )
             return
         
+        self.upload_view.log_panel.log_message(f"Transfer profile {describe(self.ssh_client.tuning)}")
+        
+        # Pick up uploads that were interrupted when the app last closed or crashed
+        self.upload_view.resume_transfers()
+        
         # Initial folder refresh
+        self.bridge.watch(self.async_client.list_folders(), self._on_initial_folders)
+    
+    def _on_initial_folders(self, folders, error):
+        """Store the initial folder list"""
         try:
-            folders, error = self.ssh_client.list_folders()
-            
             if error:
                 messagebox.showwarning(
                     "Warning",
@@ -118,13 +151,18 @@ class MainApplication(tk.Tk):
                 )
                 return
             
-            # Add folders to database
-            self.db_manager.clear_folders()
+            # Bring the folder table in line with the server in one transaction
+            _, error = self.db_manager.sync_folders([
+                (folder_name, os.path.join(REMOTE_DIR, folder_name).replace("\\", "/"))
+                for folder_name in folders
+                if folder_name  # Skip empty lines
+            ])
+            if error:
+                messagebox.showwarning("Warning", f"Could not update the folder database: {error}")
             
-            for folder_name in folders:
-                if folder_name:  # Skip empty lines
-                    full_path = os.path.join(REMOTE_DIR, folder_name).replace("\\", "/")
-                    self.db_manager.add_folder(folder_name, full_path)
+            # The views were built before the list arrived
+            self.upload_view._load_folders()
+            self.browse_view._load_folders()
         except Exception as e:
             messagebox.showwarning(
                 "Warning",
@@ -139,10 +177,22 @@ class MainApplication(tk.Tk):
     def _on_closing(self):
         """Handle window close event"""
         try:
+            # Stop background transfers
+            if hasattr(self, 'upload_view') and self.upload_view:
+                self.upload_view.close()
+            
+            # Drop pending remote operations
+            if hasattr(self, 'async_client') and self.async_client:
+                self.async_client.shutdown()
+            
             # Close SSH connection
             if hasattr(self, 'ssh_client') and self.ssh_client:
                 self.ssh_client.close()
             
+            # Write metrics still buffered
+            if hasattr(self, 'metrics') and self.metrics:
+                self.metrics.flush()
+            
             # Close database connection
             if hasattr(self, 'db_manager') and self.db_manager:
                 self.db_manager.close()
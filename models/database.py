@@ -1,24 +1,97 @@
+import math
 import os
 import sqlite3
+import threading
 from datetime import datetime
+from config import DB_CACHE_SIZE, DB_BUSY_TIMEOUT, DB_STATEMENT_CACHE
+
+# Values bound per IN (...) query, below SQLite's default limit of 999 parameters
+IN_BATCH_SIZE = 500
+
+# Groupings for get_metric_percentiles as (group expression, column that keeps groups in order)
+METRIC_GROUPS = {
+    "hour": ("strftime('%Y-%m-%d %H:00', recorded_at)", "recorded_at"),
+    "folder": ("COALESCE(folder_name, '(several)')", "metric_group"),
+    "size": (
+        "CASE WHEN bytes < 1048576 THEN '< 1 MB' "
+        "WHEN bytes < 16777216 THEN '1-16 MB' "
+        "WHEN bytes < 268435456 THEN '16-256 MB' "
+        "ELSE '>= 256 MB' END",
+        "bytes"
+    ),
+}
+
+# Most hits search_files returns
+SEARCH_LIMIT = 200
+
+# Record an uploaded or downloaded file; catalog columns of a known row are kept
+UPSERT_FILE_SQL = (
+    "INSERT INTO files (name, folder_id, local_path, remote_path, size, uploaded_at, local_sha256, remote_sha256) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (folder_id, name) DO UPDATE SET local_path = excluded.local_path, "
+    "remote_path = excluded.remote_path, size = excluded.size, uploaded_at = excluded.uploaded_at, "
+    "local_sha256 = excluded.local_sha256, remote_sha256 = excluded.remote_sha256"
+)
 
 class DatabaseManager:
+    """SQLite storage shared by the UI and background transfers
+    
+    Every thread gets its own connection, opened on first use, so workers
+    can record results while the UI reads. The database runs in WAL mode:
+    readers never wait for a writer, and commits skip the fsync of a
+    rollback journal. Concurrent writers queue up for up to DB_BUSY_TIMEOUT.
+    """
     def __init__(self, db_name, app_directory=None):
         """Initialize the database manager"""
         if app_directory is None:
             app_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
             
         self.db_path = os.path.join(app_directory, db_name)
-        self.conn = None
-        self.cursor = None
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.search_index = False
         self.init_database()
     
+    @property
+    def conn(self):
+        """Connection of the calling thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+        return conn
+    
+    @property
+    def cursor(self):
+        """Cursor of the calling thread's connection"""
+        self.conn  # Opens the connection on first use
+        return self._local.cursor
+    
+    def _connect(self):
+        """Open a connection with the pragmas every connection needs"""
+        # Each connection stays on its thread; close() may still close it from another one
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT,
+            cached_statements=DB_STATEMENT_CACHE,
+            check_same_thread=False
+        )
+        
+        # WAL only needs a full sync at checkpoints; NORMAL can lose the last commits on power loss, never consistency
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = {-DB_CACHE_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
     def init_database(self):
         """Initialize SQLite database with necessary tables"""
         try:
-            self.conn = sqlite3.connect(self.db_path)
-            self.cursor = self.conn.cursor()
-            
             # Create folders table if it doesn't exist
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS folders (
@@ -44,12 +117,141 @@ class DatabaseManager:
                 )
             ''')
             
+            # Columns added after the first release
+            self._add_missing_columns("files", {
+                "local_sha256": "TEXT",
+                "remote_sha256": "TEXT",
+                "mtime": "REAL",
+                "type": "TEXT",
+                "generation": "INTEGER"
+            })
+            
+            # Listing generation of the last catalog update of each folder
+            self._add_missing_columns("folders", {
+                "generation": "INTEGER"
+            })
+            
+            # Find earlier uploads of the same content
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_local_sha256 ON files (local_sha256)"
+            )
+            
+            # Catalog reads list a folder in name order; reconciling drops rows of older generations
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_folder_name_nocase ON files (folder_id, name COLLATE NOCASE)"
+            )
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_folder_generation ON files (folder_id, generation)"
+            )
+            
+            # Hashes of local files, valid while size and mtime are unchanged
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS hash_cache (
+                    local_path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime REAL,
+                    sha256 TEXT
+                )
+            ''')
+            
+            # Uploads that were queued, running or finished, so an interrupted batch can resume
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transfer_journal (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT,
+                    local_path TEXT,
+                    folder_name TEXT,
+                    uploads TEXT,
+                    options TEXT,
+                    state TEXT,
+                    bytes_done INTEGER,
+                    size INTEGER,
+                    error TEXT,
+                    created_at TIMESTAMP,
+                    updated_at TIMESTAMP
+                )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfer_journal_state ON transfer_journal (state)"
+            )
+            
+            # Duration, bytes and rate of every transfer and listing, for the analytics tab
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transfer_metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT,
+                    folder_name TEXT,
+                    name TEXT,
+                    bytes INTEGER,
+                    items INTEGER,
+                    duration REAL,
+                    throughput REAL,
+                    retries INTEGER,
+                    channels INTEGER,
+                    success INTEGER,
+                    recorded_at TIMESTAMP
+                )
+            ''')
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transfer_metrics_kind_time ON transfer_metrics (kind, recorded_at)"
+            )
+            
+            self.search_index = self._create_search_index()
+            
             self.conn.commit()
             return True, None
         except Exception as e:
             error_msg = f"Database initialization error: {str(e)}"
             return False, error_msg
     
+    def _create_search_index(self):
+        """Index file names for substring search, kept current by triggers on files
+        
+        Returns False when this SQLite has no FTS5 trigram tokenizer (before
+        3.34); search_files then scans with LIKE instead.
+        """
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_fts'")
+        exists = self.cursor.fetchone() is not None
+        try:
+            self.cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts "
+                "USING fts5(name, content='files', content_rowid='id', tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        
+        # Every insert, delete and rename of a file row updates the index in the same transaction
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+                INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+            END
+        ''')
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+                INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            END
+        ''')
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF name ON files BEGIN
+                INSERT INTO files_fts (files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO files_fts (rowid, name) VALUES (new.id, new.name);
+            END
+        ''')
+        
+        # Index the rows of a database from before the search index
+        if not exists:
+            self.cursor.execute("INSERT INTO files_fts (files_fts) VALUES ('rebuild')")
+        return True
+    
+    def _add_missing_columns(self, table, columns):
+        """Add columns an older database file doesn't have yet"""
+        self.cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in self.cursor.fetchall()}
+        
+        for name, column_type in columns.items():
+            if name not in existing:
+                self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+    
     def add_folder(self, folder_name, full_path):
         """Add a folder to the database"""
         try:
@@ -64,6 +266,21 @@ class DatabaseManager:
             error_msg = f"Database error when adding folder: {str(e)}"
             return False, error_msg
     
+    def add_folders(self, folders):
+        """Add many (folder_name, full_path) pairs in one transaction"""
+        try:
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cursor.executemany(
+                "INSERT OR IGNORE INTO folders (name, full_path, created_at) VALUES (?, ?, ?)",
+                [(folder_name, full_path, current_time) for folder_name, full_path in folders]
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Database error when adding folders: {str(e)}"
+            return False, error_msg
+    
     def get_all_folders(self):
         """Get all folders from the database"""
         try:
@@ -82,6 +299,15 @@ class DatabaseManager:
             error_msg = f"Error getting folder names: {str(e)}"
             return [], error_msg
     
+    def get_folder_map(self):
+        """Get {folder_name: (id, full_path)} for every folder in one query"""
+        try:
+            self.cursor.execute("SELECT name, id, full_path FROM folders")
+            return {name: (folder_id, full_path) for name, folder_id, full_path in self.cursor.fetchall()}, None
+        except Exception as e:
+            error_msg = f"Error getting folders: {str(e)}"
+            return {}, error_msg
+    
     def get_folder_id(self, folder_name):
         """Get folder ID by name"""
         try:
@@ -102,6 +328,53 @@ class DatabaseManager:
             error_msg = f"Error getting folder path: {str(e)}"
             return None, error_msg
     
+    def sync_folders(self, folders):
+        """Make the folders table match a remote list of (folder_name, full_path) pairs
+        
+        folders are the top-level folders the server lists. Only the
+        differences are written, in one transaction: new folders are inserted,
+        changed paths updated and folders gone from the server deleted. Nested
+        folders ("proj/sub", registered by add_folders) never appear in that
+        list; they are kept as long as their top-level folder exists. File
+        records are never deleted here, so their hashes still serve
+        deduplication (server-side copies check their source first); records of
+        a deleted folder simply no longer show up in listings or search.
+        Folders that stay keep their ids, so file records keep pointing at
+        them. Returns ({"added", "updated", "removed"} counts, error).
+        """
+        try:
+            existing, error = self.get_folder_map()
+            if error:
+                return None, error
+            remote = dict(folders)
+            
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            added = [
+                (folder_name, full_path, current_time)
+                for folder_name, full_path in remote.items() if folder_name not in existing
+            ]
+            updated = [
+                (full_path, existing[folder_name][0])
+                for folder_name, full_path in remote.items()
+                if folder_name in existing and existing[folder_name][1] != full_path
+            ]
+            removed = [
+                (folder_id,) for folder_name, (folder_id, _) in existing.items()
+                if folder_name.split("/", 1)[0] not in remote
+            ]
+            
+            self.cursor.executemany(
+                "INSERT INTO folders (name, full_path, created_at) VALUES (?, ?, ?)", added
+            )
+            self.cursor.executemany("UPDATE folders SET full_path = ? WHERE id = ?", updated)
+            self.cursor.executemany("DELETE FROM folders WHERE id = ?", removed)
+            self.conn.commit()
+            return {"added": len(added), "updated": len(updated), "removed": len(removed)}, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Database error when syncing folders: {str(e)}"
+            return None, error_msg
+    
     def clear_folders(self):
         """Clear all folders from the database"""
         try:
@@ -112,8 +385,9 @@ class DatabaseManager:
             error_msg = f"Error clearing folders: {str(e)}"
             return False, error_msg
     
-    def add_file(self, file_name, folder_name, local_path, remote_path, file_size):
-        """Add a file to the database"""
+    def add_file(self, file_name, folder_name, local_path, remote_path, file_size,
+                 local_sha256=None, remote_sha256=None):
+        """Add a file to the database, with the SHA-256 digests of both copies if known"""
         try:
             # Get folder ID
             folder_id, error = self.get_folder_id(folder_name)
@@ -122,9 +396,9 @@ class DatabaseManager:
             
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             self.cursor.execute(
-                "INSERT OR REPLACE INTO files (name, folder_id, local_path, remote_path, size, uploaded_at) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (file_name, folder_id, local_path, remote_path, file_size, current_time)
+                UPSERT_FILE_SQL,
+                (file_name, folder_id, local_path, remote_path, file_size, current_time,
+                 local_sha256, remote_sha256)
             )
             self.conn.commit()
             return True, None
@@ -132,6 +406,36 @@ class DatabaseManager:
             error_msg = f"Database error when adding file: {str(e)}"
             return False, error_msg
     
+    def add_files(self, files):
+        """Add many files in one transaction
+        
+        files holds (file_name, folder_name, local_path, remote_path, size,
+        local_sha256, remote_sha256) tuples; files in unknown folders are skipped.
+        """
+        try:
+            folder_map, error = self.get_folder_map()
+            if error:
+                return False, error
+            folder_ids = {folder_name: folder_id for folder_name, (folder_id, _) in folder_map.items()}
+            
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            rows = [
+                (file_name, folder_ids[folder_name], local_path, remote_path, file_size, current_time,
+                 local_sha256, remote_sha256)
+                for file_name, folder_name, local_path, remote_path, file_size, local_sha256, remote_sha256 in files
+                if folder_name in folder_ids
+            ]
+            self.cursor.executemany(UPSERT_FILE_SQL, rows)
+            self.conn.commit()
+            
+            if len(rows) < len(files):
+                return False, f"{len(files) - len(rows)} file(s) in folders not found in database"
+            return True, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Database error when adding files: {str(e)}"
+            return False, error_msg
+    
     def get_files_in_folder(self, folder_name):
         """Get all files in a folder"""
         try:
@@ -149,6 +453,113 @@ class DatabaseManager:
             error_msg = f"Error getting files in folder: {str(e)}"
             return [], error_msg
     
+    def catalog_folder(self, folder_name, entries, listed_at):
+        """Mirror a remote listing of a folder into the files table
+        
+        entries holds (name, size, mtime, type) tuples of everything in the
+        folder. In one transaction the folder moves to a new generation, every
+        entry is inserted or updated and stamped with it, and rows the listing
+        no longer has are deleted. Rows added by uploads after listed_at (a
+        datetime taken before the listing was requested) are kept.
+        Returns (generation, error).
+        """
+        try:
+            self.cursor.execute("SELECT id, full_path, generation FROM folders WHERE name = ?", (folder_name,))
+            folder = self.cursor.fetchone()
+            if not folder:
+                return None, "Folder not found in database"
+            
+            folder_id, full_path, generation = folder
+            generation = (generation or 0) + 1
+            
+            self.cursor.execute("UPDATE folders SET generation = ? WHERE id = ?", (generation, folder_id))
+            self.cursor.executemany(
+                "INSERT INTO files (name, folder_id, remote_path, size, mtime, type, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (folder_id, name) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                "type = excluded.type, generation = excluded.generation",
+                [
+                    (name, folder_id, f"{full_path.rstrip('/')}/{name}", size, mtime, entry_type, generation)
+                    for name, size, mtime, entry_type in entries
+                ]
+            )
+            self.cursor.execute(
+                "DELETE FROM files WHERE folder_id = ? AND (generation < ? OR (generation IS NULL AND uploaded_at < ?))",
+                (folder_id, generation, listed_at.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            self.conn.commit()
+            return generation, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Database error when cataloging folder: {str(e)}"
+            return None, error_msg
+    
+    def get_catalog(self, folder_name):
+        """Get the catalogued files of a folder as (name, size, mtime, type) rows in name order
+        
+        Returns (None, None) if the folder was never listed, so callers can tell
+        an empty folder from an unknown one.
+        """
+        try:
+            self.cursor.execute("SELECT id, generation FROM folders WHERE name = ?", (folder_name,))
+            folder = self.cursor.fetchone()
+            if not folder or folder[1] is None:
+                return None, None
+            
+            # Rows without a type were recorded by an upload and not listed yet
+            self.cursor.execute(
+                "SELECT name, size, mtime, COALESCE(type, 'file') FROM files "
+                "WHERE folder_id = ? AND (type = 'file' OR type IS NULL) ORDER BY name COLLATE NOCASE",
+                (folder[0],)
+            )
+            return self.cursor.fetchall(), None
+        except Exception as e:
+            error_msg = f"Error reading file catalog: {str(e)}"
+            return None, error_msg
+    
+    def search_files(self, query, limit=SEARCH_LIMIT):
+        """Find files in every folder whose name contains query, best matches first
+        
+        Exact names rank first, then names starting with query, then the
+        FTS5 rank. Queries shorter than a trigram, or databases without the
+        index, fall back to a LIKE scan. Returns ([(folder_name, file_name,
+        size, mtime), ...], error).
+        """
+        try:
+            query = query.strip()
+            if not query:
+                return [], None
+            
+            prefix = _like_escape(query) + "%"
+            select = (
+                "SELECT folders.name, files.name, files.size, files.mtime FROM {source} "
+                "JOIN folders ON folders.id = files.folder_id "
+                "WHERE {match} AND (files.type = 'file' OR files.type IS NULL) "
+                "ORDER BY files.name = ? COLLATE NOCASE DESC, files.name LIKE ? ESCAPE '\\' DESC, {rank} "
+                "LIMIT ?"
+            )
+            if self.search_index and len(query) >= 3:
+                sql = select.format(
+                    source="files_fts JOIN files ON files.id = files_fts.rowid",
+                    match="files_fts MATCH ?",
+                    rank="files_fts.rank, length(files.name)"
+                )
+                # A quoted phrase is matched as a plain substring
+                match = '"' + query.replace('"', '""') + '"'
+            else:
+                sql = select.format(
+                    source="files",
+                    match="files.name LIKE ? ESCAPE '\\'",
+                    rank="length(files.name), files.name"
+                )
+                match = "%" + _like_escape(query) + "%"
+            
+            self.cursor.execute(sql, (match, query, prefix, limit))
+            return self.cursor.fetchall(), None
+        except Exception as e:
+            error_msg = f"Error searching files: {str(e)}"
+            return [], error_msg
+    
     def get_file_by_name(self, folder_name, file_name):
         """Get file information by folder name and file name"""
         try:
@@ -166,6 +577,229 @@ class DatabaseManager:
             error_msg = f"Error getting file info: {str(e)}"
             return None, error_msg
     
+    def get_files_by_names(self, folder_name, file_names):
+        """Get {file_name: (id, local_path, remote_path, size)} for the known files among file_names
+        
+        One JOIN per IN_BATCH_SIZE names instead of two queries per file.
+        """
+        try:
+            files = {}
+            for batch in _batches(list(file_names)):
+                self.cursor.execute(
+                    "SELECT files.name, files.id, files.local_path, files.remote_path, files.size "
+                    "FROM files JOIN folders ON folders.id = files.folder_id "
+                    f"WHERE folders.name = ? AND files.name IN ({', '.join('?' * len(batch))})",
+                    [folder_name] + batch
+                )
+                for file_name, file_id, local_path, remote_path, size in self.cursor.fetchall():
+                    files[file_name] = (file_id, local_path, remote_path, size)
+            return files, None
+        except Exception as e:
+            error_msg = f"Error getting file info: {str(e)}"
+            return {}, error_msg
+    
+    def get_cached_hash(self, local_path, size, mtime):
+        """Get the SHA-256 of a local file if it was hashed at this size and mtime"""
+        try:
+            self.cursor.execute(
+                "SELECT sha256 FROM hash_cache WHERE local_path = ? AND size = ? AND mtime = ?",
+                (local_path, size, mtime)
+            )
+            result = self.cursor.fetchone()
+            return result[0] if result else None, None
+        except Exception as e:
+            error_msg = f"Error reading hash cache: {str(e)}"
+            return None, error_msg
+    
+    def get_cached_hashes(self, files):
+        """Get {local_path: sha256} for the (local_path, size, mtime) tuples hashed at that size and mtime"""
+        try:
+            wanted = {local_path: (size, mtime) for local_path, size, mtime in files}
+            hashes = {}
+            for batch in _batches(list(wanted)):
+                self.cursor.execute(
+                    "SELECT local_path, size, mtime, sha256 FROM hash_cache "
+                    f"WHERE local_path IN ({', '.join('?' * len(batch))})",
+                    batch
+                )
+                for local_path, size, mtime, sha256 in self.cursor.fetchall():
+                    if wanted[local_path] == (size, mtime):
+                        hashes[local_path] = sha256
+            return hashes, None
+        except Exception as e:
+            error_msg = f"Error reading hash cache: {str(e)}"
+            return {}, error_msg
+    
+    def cache_hash(self, local_path, size, mtime, sha256):
+        """Remember the SHA-256 of a local file at a given size and mtime"""
+        try:
+            self.cursor.execute(
+                "INSERT OR REPLACE INTO hash_cache (local_path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                (local_path, size, mtime, sha256)
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            error_msg = f"Error updating hash cache: {str(e)}"
+            return False, error_msg
+    
+    def cache_hashes(self, hashes):
+        """Remember many (local_path, size, mtime, sha256) tuples in one transaction"""
+        try:
+            self.cursor.executemany(
+                "INSERT OR REPLACE INTO hash_cache (local_path, size, mtime, sha256) VALUES (?, ?, ?, ?)",
+                hashes
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Error updating hash cache: {str(e)}"
+            return False, error_msg
+    
+    def find_remote_copies(self, sha256):
+        """Get remote paths of uploaded files with this content, verified ones first"""
+        try:
+            self.cursor.execute(
+                "SELECT remote_path FROM files "
+                "WHERE local_sha256 = ? AND (remote_sha256 IS NULL OR remote_sha256 = local_sha256) "
+                "ORDER BY remote_sha256 IS NULL, uploaded_at DESC",
+                (sha256,)
+            )
+            return [row[0] for row in self.cursor.fetchall()], None
+        except Exception as e:
+            error_msg = f"Error finding remote copies: {str(e)}"
+            return [], error_msg
+    
+    def find_remote_copies_batch(self, sha256s):
+        """Get {sha256: [remote_path, ...]} for many digests, verified copies first"""
+        try:
+            copies = {}
+            for batch in _batches(list(set(sha256s))):
+                self.cursor.execute(
+                    "SELECT local_sha256, remote_path FROM files "
+                    f"WHERE local_sha256 IN ({', '.join('?' * len(batch))}) "
+                    "AND (remote_sha256 IS NULL OR remote_sha256 = local_sha256) "
+                    "ORDER BY remote_sha256 IS NULL, uploaded_at DESC",
+                    batch
+                )
+                for sha256, remote_path in self.cursor.fetchall():
+                    copies.setdefault(sha256, []).append(remote_path)
+            return copies, None
+        except Exception as e:
+            error_msg = f"Error finding remote copies: {str(e)}"
+            return {}, error_msg
+    
+    def record_metrics(self, metrics):
+        """Store many metric rows in one transaction
+        
+        metrics holds (kind, folder_name, name, bytes, items, duration,
+        throughput, retries, channels, success, recorded_at) tuples.
+        """
+        try:
+            self.cursor.executemany(
+                "INSERT INTO transfer_metrics (kind, folder_name, name, bytes, items, duration, throughput, "
+                "retries, channels, success, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                metrics
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Error recording metrics: {str(e)}"
+            return False, error_msg
+    
+    def get_metric_percentiles(self, kind, group_by, since):
+        """Get the median and slow tail of duration and throughput of one kind of operation per group
+        
+        The slow tail is p95 for durations but p5 for throughput, so both
+        columns show the worst 5% rather than the fastest. group_by is a key of
+        METRIC_GROUPS ("hour", "folder" or "size"); only successful operations
+        recorded after the datetime since count. Returns ([{"group", "count",
+        "retries", "duration_p50", "duration_p95", "throughput_p50",
+        "throughput_p5"}, ...], error) in group order; throughput is None for
+        listings.
+        """
+        try:
+            group, order = METRIC_GROUPS[group_by]
+            self.cursor.execute(
+                f"SELECT {group} AS metric_group, duration, throughput, retries FROM transfer_metrics "
+                f"WHERE kind = ? AND success = 1 AND recorded_at >= ? ORDER BY {order}",
+                (kind, since.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            
+            groups = {}
+            for metric_group, duration, throughput, retries in self.cursor.fetchall():
+                durations, throughputs, retry_counts = groups.setdefault(metric_group, ([], [], []))
+                durations.append(duration)
+                if throughput is not None:
+                    throughputs.append(throughput)
+                retry_counts.append(retries or 0)
+            
+            rows = []
+            for metric_group, (durations, throughputs, retry_counts) in groups.items():
+                rows.append({
+                    "group": metric_group,
+                    "count": len(durations),
+                    "retries": sum(retry_counts),
+                    "duration_p50": _percentile(durations, 0.50),
+                    "duration_p95": _percentile(durations, 0.95),
+                    "throughput_p50": _percentile(throughputs, 0.50),
+                    "throughput_p5": _percentile(throughputs, 0.05),
+                })
+            return rows, None
+        except Exception as e:
+            error_msg = f"Error reading metrics: {str(e)}"
+            return [], error_msg
+    
+    def save_transfers(self, transfers):
+        """Insert or update many transfer journal entries in one transaction
+        
+        transfers holds (id, kind, local_path, folder_name, uploads, options,
+        state, bytes_done, size, error) tuples; existing entries keep their kind,
+        paths and options and only take the new state, bytes done and error.
+        """
+        try:
+            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.cursor.executemany(
+                "INSERT INTO transfer_journal (id, kind, local_path, folder_name, uploads, options, state, "
+                "bytes_done, size, error, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET state = excluded.state, bytes_done = excluded.bytes_done, "
+                "error = excluded.error, updated_at = excluded.updated_at",
+                [transfer + (current_time, current_time) for transfer in transfers]
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            self.conn.rollback()
+            error_msg = f"Error updating transfer journal: {str(e)}"
+            return False, error_msg
+    
+    def get_unfinished_transfers(self):
+        """Get journal entries that were queued or running, oldest first"""
+        try:
+            self.cursor.execute(
+                "SELECT id, kind, local_path, folder_name, uploads, options, state, bytes_done, size "
+                "FROM transfer_journal WHERE state IN ('queued', 'running') ORDER BY created_at, rowid"
+            )
+            return self.cursor.fetchall(), None
+        except Exception as e:
+            error_msg = f"Error reading transfer journal: {str(e)}"
+            return [], error_msg
+    
+    def prune_transfers(self, before):
+        """Delete finished journal entries last updated before a timestamp"""
+        try:
+            self.cursor.execute(
+                "DELETE FROM transfer_journal WHERE state IN ('done', 'failed') AND updated_at < ?",
+                (before.strftime('%Y-%m-%d %H:%M:%S'),)
+            )
+            self.conn.commit()
+            return True, None
+        except Exception as e:
+            error_msg = f"Error pruning transfer journal: {str(e)}"
+            return False, error_msg
+    
     def delete_file(self, file_id):
         """Delete a file from the database by ID"""
         try:
@@ -177,6 +811,32 @@ class DatabaseManager:
             return False, error_msg
     
     def close(self):
-        """Close the database connection"""
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        """Close the connections of all threads"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass  # Still in use by a worker that is shutting down
+        self._local = threading.local()
+
+
+def _batches(values):
+    """Split query parameters into lists of at most IN_BATCH_SIZE"""
+    for start in range(0, len(values), IN_BATCH_SIZE):
+        yield values[start:start + IN_BATCH_SIZE]
+
+
+def _like_escape(text):
+    """Escape LIKE wildcards so text matches literally with ESCAPE '\\'"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers, None if it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
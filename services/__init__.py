@@ -1 +1,5 @@
-from .ssh_client import SSHClient
\ No newline at end of file
+from .ssh_client import SSHClient, RemoteEntry
+from .transfer_queue import TransferQueue, TransferItem, ArchiveTransferItem
+from .async_client import AsyncSSHClient
+from .journal import TransferJournal
+from .metrics import MetricsRecorder
\ No newline at end of file
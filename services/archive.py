@@ -0,0 +1,44 @@
+import hashlib
+import os
+import tarfile
+from .chunked_transfer import HashingReader
+
+
+class HashingWriter:
+    """File wrapper that hashes (and optionally throttles) everything written through it"""
+    def __init__(self, file, digest, throttle=None):
+        """Wrap an open binary file"""
+        self.file = file
+        self.digest = digest
+        self.throttle = throttle
+
+    def write(self, data):
+        """Hash data and write it to the file"""
+        self.digest.update(data)
+        self.file.write(data)
+        if self.throttle:
+            self.throttle(len(data))
+        return len(data)
+
+
+def write_archive(fileobj, members):
+    """Stream a tar of (local_path, arcname) members into a writable file object
+
+    Nothing is buffered beyond tarfile's own blocks, so the archive can go
+    straight into a remote file. Every file is read once; returns a dict of
+    arcname -> (size, sha256, mtime) for the bytes that went into the archive.
+    """
+    written = {}
+    with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT) as archive:
+        for local_path, arcname in members:
+            with open(local_path, "rb") as local_file:
+                local_stat = os.fstat(local_file.fileno())
+                info = tarfile.TarInfo(arcname)
+                info.size = local_stat.st_size
+                info.mtime = local_stat.st_mtime
+                info.mode = 0o644
+
+                digest = hashlib.sha256()
+                archive.addfile(info, HashingReader(local_file, digest))
+                written[arcname] = (local_stat.st_size, digest.hexdigest(), local_stat.st_mtime)
+    return written
@@ -0,0 +1,88 @@
+from .scheduler import INTERACTIVE, NORMAL, BULK
+
+
+class AsyncSSHClient:
+    """Runs SSHClient operations on the client's scheduler and returns futures
+
+    Every operation resolves to the same (result, error) tuple the blocking
+    SSHClient method returns; unexpected exceptions are turned into
+    (None, message) so callers only ever handle one shape of result. Listings,
+    stats and folder operations run in the interactive class, downloads and
+    batched folder creation in the normal class unless the caller asks
+    otherwise (previews are interactive).
+    """
+    def __init__(self, ssh_client):
+        """Initialize the facade over a shared SSHClient"""
+        self.ssh_client = ssh_client
+        self._futures = set()
+
+    def submit(self, priority_class, operation, *args, **kwargs):
+        """Run ssh_client.<operation>(*args, **kwargs) in the background"""
+        future = self.ssh_client.scheduler.submit(priority_class, self._call, operation, args, kwargs)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def run(self, priority_class, fn, *args, **kwargs):
+        """Run any function that returns a (result, error) tuple in the background"""
+        future = self.ssh_client.scheduler.submit(priority_class, self._call_function, fn, args, kwargs)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def connect(self):
+        """Connect to the server"""
+        return self.submit(INTERACTIVE, "connect")
+
+    def list_folders(self, use_cache=True):
+        """List folders under the remote root"""
+        return self.submit(INTERACTIVE, "list_folders", use_cache=use_cache)
+
+    def list_files(self, folder_name):
+        """List file names in a remote folder"""
+        return self.submit(INTERACTIVE, "list_files", folder_name)
+
+    def list_directory(self, folder_name, use_cache=True):
+        """List a remote folder with file attributes"""
+        return self.submit(INTERACTIVE, "list_directory", folder_name, use_cache=use_cache)
+
+    def get_file_info(self, folder_name, file_name):
+        """Get size and mtime of a remote file"""
+        return self.submit(INTERACTIVE, "get_file_info", folder_name, file_name)
+
+    def create_folder(self, folder_name):
+        """Create a remote folder"""
+        return self.submit(INTERACTIVE, "create_folder", folder_name)
+
+    def upload_file(self, local_file_path, folder_name, priority_class=BULK, **kwargs):
+        """Upload a file to a remote folder"""
+        return self.submit(priority_class, "upload_file", local_file_path, folder_name, **kwargs)
+
+    def download_file(self, folder_name, file_name, local_dir, priority_class=NORMAL, **kwargs):
+        """Download a remote file into a local directory"""
+        return self.submit(priority_class, "download_file", folder_name, file_name, local_dir, **kwargs)
+
+    def delete_file(self, folder_name, file_name):
+        """Delete a remote file"""
+        return self.submit(INTERACTIVE, "delete_file", folder_name, file_name)
+
+    def create_folders(self, folder_names):
+        """Create many remote folders in batched commands"""
+        return self.submit(NORMAL, "create_folders", folder_names)
+
+    def shutdown(self):
+        """Drop pending operations; running ones stop when the client closes"""
+        for future in list(self._futures):
+            future.cancel()
+
+    def _call(self, operation, args, kwargs):
+        """Run a single SSHClient method on a worker thread"""
+        return self._call_function(getattr(self.ssh_client, operation), args, kwargs)
+
+    @staticmethod
+    def _call_function(fn, args, kwargs):
+        """Run fn on a worker thread, turning exceptions into (None, error)"""
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            return None, str(e)
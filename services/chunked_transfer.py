@@ -0,0 +1,402 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .scheduler import current_priority, priority
+
+# Size of a single local read / remote write inside a byte range
+BLOCK_SIZE = 256 * 1024
+
+
+def split_ranges(total_size, chunk_size, start=0):
+    """Split the byte span [start, total_size) into (offset, length) ranges"""
+    ranges = []
+    offset = start
+    while offset < total_size:
+        length = min(chunk_size, total_size - offset)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+def read_blocks(remote_file, offset, length, read_ahead=None):
+    """Read [offset, offset + length) of a remote file with pipelined requests
+
+    Yields (offset, data) per block, with at most read_ahead bytes requested
+    ahead of the reader (everything at once when None).
+
+    paramiko stops prefetching for good when the reader has consumed every
+    answer before the next request goes out, which is common on fast links,
+    and each read after that costs a full round trip. When that happens the
+    rest is requested again with a fresh readv, which skips blocks already
+    requested or received.
+    """
+    end = offset + length
+    window = max(read_ahead or length, BLOCK_SIZE)
+    while offset < end:
+        blocks = split_ranges(min(offset + window, end), BLOCK_SIZE, offset)
+        index = 0
+        while index < len(blocks):
+            for data in remote_file.readv(blocks[index:]):
+                block_offset, block_length = blocks[index]
+                if len(data) != block_length:
+                    raise IOError(f"Short read at offset {block_offset}: the remote file changed")
+                index += 1
+                yield block_offset, data
+                if index < len(blocks) and not getattr(remote_file, "_prefetching", True):
+                    break
+        offset = blocks[-1][0] + blocks[-1][1]
+
+
+def with_retries(operation, retries, backoff, on_retry=None):
+    """Run operation(), retrying failures with exponential backoff
+
+    on_retry, if given, is called before every retry.
+    """
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except Exception:
+            if attempt >= retries:
+                raise
+            if on_retry:
+                on_retry()
+            time.sleep(backoff * (2 ** attempt))
+            attempt += 1
+
+
+def prefix_digest(local_path, length, algorithm="sha256", digest=None):
+    """Hash object fed with the first length bytes of a local file
+
+    digest, if given, is fed instead of a new hash object.
+    """
+    digest = digest if digest is not None else hashlib.new(algorithm)
+    remaining = length
+    with open(local_path, "rb") as local_file:
+        while remaining > 0:
+            data = local_file.read(min(BLOCK_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            remaining -= len(data)
+    return digest
+
+
+def finalize_remote_file(sftp, temp_path, remote_path):
+    """Move a finished temporary file over its final name"""
+    try:
+        # Atomic replace where the server supports the posix-rename extension
+        sftp.posix_rename(temp_path, remote_path)
+    except IOError:
+        # Plain SFTP rename refuses to overwrite, so drop the old copy first
+        try:
+            sftp.remove(remote_path)
+        except IOError:
+            pass
+        sftp.rename(temp_path, remote_path)
+
+
+class HashingReader:
+    """File wrapper that feeds everything read through it into a digest"""
+    def __init__(self, file, digest):
+        """Wrap an open binary file"""
+        self.file = file
+        self.digest = digest
+
+    def read(self, size=-1):
+        """Read from the file and hash what was read"""
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+
+class StreamHasher:
+    """Hashes blocks that arrive out of order, in file order
+
+    Blocks ahead of the next expected offset are held until the gap is filled.
+    Blocks that were already hashed (a retried range) are ignored. Callers
+    bound the buffer by waiting with wait_for() before reading far ahead.
+    """
+    def __init__(self, digest, offset=0):
+        """Continue digest, which already covers the first offset bytes"""
+        self.digest = digest
+        self.offset = offset
+        self._early = {}
+        self._cancelled = False
+        self._cond = threading.Condition()
+
+    def update(self, offset, data):
+        """Hash a block read at offset"""
+        with self._cond:
+            if offset < self.offset:
+                return
+            self._early[offset] = data
+            advanced = False
+            while self.offset in self._early:
+                block = self._early.pop(self.offset)
+                self.digest.update(block)
+                self.offset += len(block)
+                advanced = True
+            if advanced:
+                self._cond.notify_all()
+
+    def wait_for(self, offset):
+        """Block until everything before offset is hashed or cancel() is called"""
+        with self._cond:
+            while self.offset < offset and not self._cancelled:
+                self._cond.wait()
+
+    def cancel(self):
+        """Release every wait_for(); the hash will not be completed"""
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+
+class RangeTransfer:
+    """Moves a file as byte ranges over several SFTP channels in parallel
+
+    Base of ChunkedUploader and ChunkedDownloader. Each range is retried with
+    backoff on its own; after a failure the partial file can be cut back to the
+    longest run of completed ranges so a later call resumes from there.
+    Channels are borrowed per range from session(), so no thread ever holds
+    more than one at a time. throttle(n), if given, is called after every n
+    bytes moved and may block to limit bandwidth; on_retry() before every
+    retried range.
+    """
+    def __init__(self, session, channels, chunk_size, retries=0, backoff=1.0, throttle=None, on_retry=None):
+        """Initialize the transfer with a context manager factory for SFTP channels"""
+        self.session = session
+        self.channels = max(1, channels)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.throttle = throttle
+        self.on_retry = on_retry
+        self._lock = threading.Lock()
+        self._pending = []
+        self._completed = set()
+        self._failed = threading.Event()
+
+    def _transfer_ranges(self, total_size, start_offset, local_path, local_mode):
+        """Move every range of [start_offset, total_size) with parallel workers"""
+        self._pending = split_ranges(total_size, self.chunk_size, start_offset)
+        self._pending.reverse()  # Pop from the end while keeping ascending order
+        self._completed = set()
+        self._failed.clear()
+
+        workers = min(self.channels, len(self._pending)) or 1
+        priority_class = current_priority()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._worker, local_path, local_mode, priority_class)
+                for _ in range(workers)
+            ]
+            for future in futures:
+                future.result()
+
+    def _next_range(self):
+        """Take the next unsent byte range, or None when done"""
+        with self._lock:
+            if self._failed.is_set() or not self._pending:
+                return None
+            return self._pending.pop()
+
+    def _written_prefix(self, start_offset):
+        """Length of the contiguous run of completed ranges from start_offset"""
+        end = start_offset
+        with self._lock:
+            completed = dict(self._completed)
+        while end in completed:
+            end += completed[end]
+        return end
+
+    def _worker(self, local_path, local_mode, priority_class):
+        """Move byte ranges until none are left"""
+        try:
+            with priority(priority_class), open(local_path, local_mode) as local_file:
+                while True:
+                    byte_range = self._next_range()
+                    if byte_range is None:
+                        break
+
+                    with_retries(
+                        lambda: self._transfer_range(local_file, byte_range),
+                        self.retries,
+                        self.backoff,
+                        self.on_retry
+                    )
+                    with self._lock:
+                        self._completed.add(byte_range)
+        except Exception:
+            self._failed.set()
+            raise
+
+    def _transfer_range(self, local_file, byte_range):
+        """Move one byte range"""
+        raise NotImplementedError
+
+
+class ChunkedUploader(RangeTransfer):
+    """Upload a file as byte ranges written in parallel over several SFTP channels
+
+    Data goes to "<remote_path>.part" and is renamed into place once complete.
+    Passing a digest to upload() hashes the file while it is sent, so every byte
+    is read from disk only once. Blocks read ahead of the hash wait in memory,
+    so while hashing no range starts more than one range per channel past the
+    hashed prefix; a stalled or retrying range holds the others back instead
+    of letting the rest of the file pile up.
+    """
+    def __init__(self, session, channels, chunk_size, retries=0, backoff=1.0, throttle=None, on_retry=None):
+        """Initialize the uploader with a context manager factory for SFTP channels"""
+        super().__init__(session, channels, chunk_size, retries, backoff, throttle, on_retry)
+        self._temp_path = None
+        self._hasher = None
+
+    def upload(self, local_path, remote_path, start_offset=0, digest=None):
+        """Upload local_path to remote_path and return the number of bytes sent
+
+        digest, if given, must already cover the first start_offset bytes; it is
+        fed the rest of the file as it goes out.
+        """
+        file_size = os.path.getsize(local_path)
+        temp_path = f"{remote_path}.part"
+        self._temp_path = temp_path
+        self._hasher = StreamHasher(digest, start_offset) if digest is not None else None
+
+        with self.session() as control:
+            if start_offset:
+                # Drop anything past the verified prefix
+                control.truncate(temp_path, start_offset)
+            else:
+                # Create (or truncate) the temporary file the workers write into
+                control.open(temp_path, "wb").close()
+
+        try:
+            self._transfer_ranges(file_size, start_offset, local_path, "rb")
+        except Exception:
+            self._keep_written_prefix(temp_path, start_offset)
+            raise
+
+        with self.session() as control:
+            # Make sure every range landed before publishing the file
+            remote_size = control.stat(temp_path).st_size
+            if remote_size != file_size:
+                raise IOError(
+                    f"Chunked upload incomplete: {remote_size} of {file_size} bytes written"
+                )
+
+            finalize_remote_file(control, temp_path, remote_path)
+        return file_size - start_offset
+
+    def _next_range(self):
+        """Take the next range once the hash has caught up close enough to it"""
+        byte_range = super()._next_range()
+        if byte_range is not None and self._hasher:
+            self._hasher.wait_for(byte_range[0] - self.channels * self.chunk_size)
+            if self._failed.is_set():
+                return None
+        return byte_range
+
+    def _worker(self, local_path, local_mode, priority_class):
+        """Move byte ranges; a failure releases workers waiting for the hash"""
+        try:
+            super()._worker(local_path, local_mode, priority_class)
+        except Exception:
+            if self._hasher:
+                self._hasher.cancel()
+            raise
+
+    def _keep_written_prefix(self, temp_path, start_offset):
+        """Cut a failed .part file back to the part that is known to be good"""
+        try:
+            with self.session() as sftp:
+                sftp.truncate(temp_path, self._written_prefix(start_offset))
+        except Exception:
+            # The next attempt verifies the prefix by hash anyway
+            pass
+
+    def _transfer_range(self, local_file, byte_range):
+        """Write one byte range; returns once the server acknowledged every write"""
+        offset, length = byte_range
+        local_file.seek(offset)
+
+        # Closing the handle waits for all pipelined write acks
+        with self.session() as sftp, sftp.open(self._temp_path, "r+b") as remote_file:
+            # Don't wait for a server ack after every write request
+            remote_file.set_pipelined(True)
+            remote_file.seek(offset)
+
+            remaining = length
+            while remaining > 0:
+                data = local_file.read(min(BLOCK_SIZE, remaining))
+                if not data:
+                    raise IOError(f"Unexpected end of file at offset {offset + length - remaining}")
+                if self._hasher:
+                    self._hasher.update(offset + length - remaining, data)
+                remote_file.write(data)
+                remaining -= len(data)
+                if self.throttle:
+                    self.throttle(len(data))
+
+
+class ChunkedDownloader(RangeTransfer):
+    """Download a file as byte ranges read in parallel over several SFTP channels
+
+    "<local_path>.part" is preallocated to the full size, every worker writes its
+    ranges at their offsets, and the file is renamed into place once complete.
+    """
+    def __init__(self, session, channels, chunk_size, retries=0, backoff=1.0, throttle=None,
+                 read_ahead=None, on_retry=None):
+        """Initialize the downloader with a context manager factory for SFTP channels
+
+        read_ahead bounds the bytes each channel has requested but not yet
+        received (see read_blocks).
+        """
+        super().__init__(session, channels, chunk_size, retries, backoff, throttle, on_retry)
+        self.read_ahead = read_ahead
+        self._remote_path = None
+
+    def download(self, remote_path, local_path, remote_size, start_offset=0):
+        """Download remote_path to local_path and return the number of bytes received
+
+        With start_offset the first bytes of an existing .part file are kept.
+        """
+        temp_path = f"{local_path}.part"
+        self._remote_path = remote_path
+
+        with open(temp_path, "r+b" if start_offset else "wb") as local_file:
+            # Drop anything past the kept prefix, then reserve the whole file
+            local_file.truncate(start_offset)
+            local_file.truncate(remote_size)
+
+        try:
+            self._transfer_ranges(remote_size, start_offset, temp_path, "r+b")
+        except Exception:
+            # Leave only data that is known to be complete for the next attempt
+            try:
+                os.truncate(temp_path, self._written_prefix(start_offset))
+            except OSError:
+                pass
+            raise
+
+        os.replace(temp_path, local_path)
+        return remote_size - start_offset
+
+    def _transfer_range(self, local_file, byte_range):
+        """Read one byte range with pipelined requests and write it at its offset"""
+        offset, length = byte_range
+
+        with self.session() as sftp, sftp.open(self._remote_path, "rb") as remote_file:
+            local_file.seek(offset)
+            received = 0
+            for _, data in read_blocks(remote_file, offset, length, self.read_ahead):
+                local_file.write(data)
+                received += len(data)
+                if self.throttle:
+                    self.throttle(len(data))
+        if received != length:
+            raise IOError(f"Range at offset {offset} incomplete: {received} of {length} bytes")
+        local_file.flush()
@@ -0,0 +1,47 @@
+import os
+import zlib
+
+# Formats that are already compressed; sampling them would only waste CPU
+COMPRESSED_EXTENSIONS = {
+    ".7z", ".bz2", ".gz", ".rar", ".tgz", ".xz", ".zip", ".zst",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".jar", ".apk",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mkv", ".mov", ".avi", ".ogg", ".webm",
+    ".pdf",
+}
+
+# Bytes read from the start of a file to estimate how well it compresses
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 4
+
+
+def estimate_compression_ratio(local_path):
+    """Estimate original/compressed size from the first blocks of a file"""
+    compressor = zlib.compressobj(1)  # Fast level; good enough for an estimate
+    sampled = 0
+    compressed = 0
+
+    with open(local_path, "rb") as local_file:
+        for _ in range(SAMPLE_BLOCKS):
+            data = local_file.read(SAMPLE_BLOCK_SIZE)
+            if not data:
+                break
+            sampled += len(data)
+            compressed += len(compressor.compress(data))
+    compressed += len(compressor.flush())
+
+    if sampled == 0:
+        return 1.0
+    return sampled / max(compressed, 1)
+
+
+def should_compress(local_path, min_ratio):
+    """Decide whether sending a file over a compressed channel pays off"""
+    extension = os.path.splitext(local_path)[1].lower()
+    if extension in COMPRESSED_EXTENSIONS:
+        return False
+
+    try:
+        return estimate_compression_ratio(local_path) >= min_ratio
+    except OSError:
+        return False
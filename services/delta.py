@@ -0,0 +1,262 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+
+# Modulus of the Adler-32 checksum used as the rolling (weak) block checksum
+ADLER_MOD = 65521
+
+# One signature entry: weak checksum + 16-byte strong checksum
+BLOCK_ENTRY = struct.Struct("<I16s")
+
+# Blocks scanned before compute_delta may give up on a mostly changed file
+BAILOUT_MIN_BLOCKS = 16
+
+
+def strong_checksum(data):
+    """Strong checksum of a block"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def weak_checksum(data):
+    """Weak checksum of a block, matching the rolling update below"""
+    return zlib.adler32(data)
+
+
+class BlockSignature:
+    """Per-block weak and strong checksums of one version of a file"""
+    def __init__(self, size, block_size, blocks):
+        """Initialize the signature with a list of (weak, strong) block checksums"""
+        self.size = size
+        self.block_size = block_size
+        self.blocks = blocks
+
+    def block_length(self, index):
+        """Length of a block (the last one may be short)"""
+        return min(self.block_size, self.size - index * self.block_size)
+
+    @classmethod
+    def from_file(cls, local_path, block_size):
+        """Compute the signature of a local file"""
+        blocks = []
+        with open(local_path, "rb") as local_file:
+            while True:
+                data = local_file.read(block_size)
+                if not data:
+                    break
+                blocks.append((weak_checksum(data), strong_checksum(data)))
+        return cls(os.path.getsize(local_path), block_size, blocks)
+
+
+class SignatureHasher:
+    """Hash object that also builds the BlockSignature of the bytes fed to it
+
+    Stands in for the digest an upload feeds in file order, so the signature
+    kept for the next delta comes from the same reads as the SHA-256.
+    """
+    def __init__(self, digest, block_size):
+        """Wrap digest, cutting the data fed to it into blocks of block_size"""
+        self.digest = digest
+        self.block_size = block_size
+        self.size = 0
+        self.blocks = []
+        self._partial = b""
+
+    def update(self, data):
+        """Hash data and add the blocks it completes to the signature"""
+        self.digest.update(data)
+        self.size += len(data)
+
+        pos = 0
+        if self._partial:
+            pos = self.block_size - len(self._partial)
+            self._partial += bytes(data[:pos])
+            if len(self._partial) < self.block_size:
+                return
+            self._add_block(self._partial)
+        while pos + self.block_size <= len(data):
+            self._add_block(data[pos:pos + self.block_size])
+            pos += self.block_size
+        self._partial = bytes(data[pos:])
+
+    def hexdigest(self):
+        """Hex digest of everything fed so far"""
+        return self.digest.hexdigest()
+
+    def signature(self):
+        """Signature of everything fed so far"""
+        blocks = list(self.blocks)
+        if self._partial:
+            blocks.append((weak_checksum(self._partial), strong_checksum(self._partial)))
+        return BlockSignature(self.size, self.block_size, blocks)
+
+    def _add_block(self, block):
+        """Append the checksums of one full block"""
+        self.blocks.append((weak_checksum(block), strong_checksum(block)))
+
+
+def compute_delta(local_path, signature, digest=None, max_literal_ratio=None):
+    """Match a local file against the signature of the remote copy
+
+    Returns a list of coalesced operations that rebuild the local file from the old
+    remote one: ("copy", src_offset, dst_offset, length) for data already on the
+    server and ("data", dst_offset, length) for bytes that must be sent. A digest,
+    if given, is fed the whole file from the same mapping.
+
+    Rolling over changed data costs far more CPU than sending it, so with
+    max_literal_ratio the scan gives up and returns None as soon as more than
+    that share of the bytes scanned so far must be sent (checked once
+    BAILOUT_MIN_BLOCKS blocks are scanned); the digest is then left untouched.
+    """
+    block_size = signature.block_size
+    size = os.path.getsize(local_path)
+
+    weak_index = {}
+    for index, (weak, _) in enumerate(signature.blocks):
+        weak_index.setdefault(weak, []).append(index)
+
+    ops = []
+
+    def emit(op):
+        # Merge with the previous operation when they are contiguous
+        if ops and ops[-1][0] == op[0]:
+            last = ops[-1]
+            if op[0] == "data" and last[1] + last[2] == op[1]:
+                ops[-1] = ("data", last[1], last[2] + op[2])
+                return
+            if op[0] == "copy" and last[1] + last[3] == op[1] and last[2] + last[3] == op[2]:
+                ops[-1] = ("copy", last[1], last[2], last[3] + op[3])
+                return
+        ops.append(op)
+
+    if size == 0:
+        return ops
+
+    with open(local_path, "rb") as local_file, \
+            mmap.mmap(local_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        def find_block(pos, weak, length):
+            """Find an old block with the same content as data[pos:pos+length]"""
+            candidates = weak_index.get(weak)
+            if not candidates:
+                return None
+            strong = None
+            for index in candidates:
+                if signature.block_length(index) != length:
+                    continue
+                if strong is None:
+                    strong = strong_checksum(data[pos:pos + length])
+                if signature.blocks[index][1] == strong:
+                    return index
+            return None
+
+        pos = 0
+        literal_start = 0
+        literal_bytes = 0  # In emitted data operations
+        while pos < size:
+            if (max_literal_ratio is not None and pos >= BAILOUT_MIN_BLOCKS * block_size
+                    and literal_bytes + pos - literal_start > max_literal_ratio * pos):
+                return None
+
+            length = min(block_size, size - pos)
+            weak = weak_checksum(data[pos:pos + length])
+            index = find_block(pos, weak, length)
+
+            if index is None:
+                if pos + block_size >= size:
+                    break  # No room left to roll; the rest is new data
+
+                # Roll the window forward one byte at a time, for at most one block
+                a = weak & 0xffff
+                b = weak >> 16
+                stop = min(pos + block_size, size - block_size)
+                while pos < stop:
+                    outgoing = data[pos]
+                    incoming = data[pos + block_size]
+                    a = (a - outgoing + incoming) % ADLER_MOD
+                    b = (b - block_size * outgoing + a - 1) % ADLER_MOD
+                    pos += 1
+                    weak = (b << 16) | a
+                    if weak in weak_index:
+                        index = find_block(pos, weak, block_size)
+                        if index is not None:
+                            break
+
+                if index is None:
+                    continue
+                length = block_size
+
+            if pos > literal_start:
+                emit(("data", literal_start, pos - literal_start))
+                literal_bytes += pos - literal_start
+            emit(("copy", index * block_size, pos, length))
+            pos += length
+            literal_start = pos
+
+        if literal_start < size:
+            emit(("data", literal_start, size - literal_start))
+
+        if digest is not None:
+            digest.update(data)
+
+    return ops
+
+
+class SignatureStore:
+    """Local cache of block signatures for files we uploaded
+
+    A signature is only trusted while the remote file still has the size and mtime
+    recorded right after our upload, so changes made by others are never patched.
+    """
+    def __init__(self, directory):
+        """Initialize the store in the given directory"""
+        if not os.path.isabs(directory):
+            app_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            directory = os.path.join(app_directory, directory)
+        self.directory = directory
+
+    def _path(self, remote_path):
+        """File that holds the signature of a remote path"""
+        key = hashlib.sha1(remote_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.sig")
+
+    def load(self, remote_path, remote_size, remote_mtime):
+        """Load the signature of a remote file, or None if missing or stale"""
+        try:
+            with open(self._path(remote_path), "rb") as sig_file:
+                header = json.loads(sig_file.readline().decode("utf-8"))
+                if (header["remote_path"] != remote_path
+                        or header["size"] != remote_size
+                        or header["mtime"] != remote_mtime):
+                    return None
+                raw = sig_file.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+        blocks = list(BLOCK_ENTRY.iter_unpack(raw))
+        return BlockSignature(header["size"], header["block_size"], blocks)
+
+    def save(self, remote_path, remote_mtime, signature):
+        """Store the signature of a remote file as of remote_mtime"""
+        os.makedirs(self.directory, exist_ok=True)
+        header = {
+            "remote_path": remote_path,
+            "size": signature.size,
+            "mtime": remote_mtime,
+            "block_size": signature.block_size,
+        }
+        path = self._path(remote_path)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as sig_file:
+            sig_file.write(json.dumps(header).encode("utf-8") + b"\n")
+            for weak, strong in signature.blocks:
+                sig_file.write(BLOCK_ENTRY.pack(weak, strong))
+        os.replace(temp_path, path)
+
+    def discard(self, remote_path):
+        """Forget the signature of a remote file"""
+        try:
+            os.remove(self._path(remote_path))
+        except OSError:
+            pass
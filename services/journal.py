@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from .transfer_queue import DONE, FAILED
+
+FLUSH_INTERVAL = 1.0  # Seconds between journal writes while transfers run
+RETENTION_DAYS = 7  # Finished entries are kept this long
+
+
+class TransferJournal:
+    """Crash-safe record of queued, running and finished uploads
+
+    Workers only mark items as changed; flush() writes the state and bytes
+    done of every changed or running item in a single transaction, so a batch
+    costs one commit per FLUSH_INTERVAL no matter how many files move. The
+    database is only touched from the thread that calls flush().
+    """
+    def __init__(self, db_manager, flush_interval=FLUSH_INTERVAL):
+        """Initialize an empty journal on top of a DatabaseManager"""
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self._items = {}  # journal id -> item still to be written or running
+        self._written = {}  # journal id -> (state, bytes done) last stored
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def track(self, item):
+        """Note that an item was queued or changed state; may be called from any thread"""
+        with self._lock:
+            self._items[item.journal_id] = item
+
+    def flush(self, force=False):
+        """Store pending changes, at most once per flush_interval unless forced
+
+        Returns (success, error).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return True, None
+        self._last_flush = now
+
+        with self._lock:
+            items = list(self._items.values())
+
+        rows = []
+        for item in items:
+            state, done = item.state, item.progress.snapshot()["done"]
+            if self._written.get(item.journal_id) != (state, done):
+                rows.append((item, state, done))
+        if not rows:
+            return True, None
+
+        success, error = self.db_manager.save_transfers([self._row(item, state, done) for item, state, done in rows])
+        if not success:
+            return False, error
+
+        with self._lock:
+            for item, state, done in rows:
+                self._written[item.journal_id] = (state, done)
+                # Finished items need no more writes once their final state is stored
+                if state in (DONE, FAILED) and self._items.get(item.journal_id) is item:
+                    del self._items[item.journal_id]
+                    del self._written[item.journal_id]
+        return True, None
+
+    def unfinished(self):
+        """Entries that were queued or running when the app last stopped
+
+        Returns ([entry, ...], error); each entry is a dict with the journal
+        id, kind ("file" or "archive"), local_path, folder_name, uploads,
+        options, bytes_done and size. Entries whose local files are gone are
+        marked failed and left out. Old finished entries are pruned here too.
+        """
+        self.db_manager.prune_transfers(datetime.now() - timedelta(days=RETENTION_DAYS))
+
+        rows, error = self.db_manager.get_unfinished_transfers()
+        if error:
+            return [], error
+
+        entries = []
+        missing = []
+        for journal_id, kind, local_path, folder_name, uploads, options, state, bytes_done, size in rows:
+            entry = {
+                "id": journal_id,
+                "kind": kind,
+                "local_path": local_path,
+                "folder_name": folder_name,
+                "uploads": [tuple(upload) for upload in json.loads(uploads or "[]")],
+                "options": json.loads(options or "{}"),
+                "bytes_done": bytes_done or 0,
+                "size": size or 0
+            }
+            if kind == "archive":
+                entry["uploads"] = [upload for upload in entry["uploads"] if os.path.exists(upload[0])]
+                present = bool(entry["uploads"])
+            else:
+                present = os.path.exists(local_path)
+
+            if present:
+                entries.append(entry)
+            else:
+                missing.append((journal_id, kind, local_path, folder_name, uploads, options,
+                                FAILED, bytes_done, size, "Local file no longer exists"))
+
+        if missing:
+            self.db_manager.save_transfers(missing)
+        return entries, None
+
+    @staticmethod
+    def _row(item, state, done):
+        """Journal row for an item in the layout DatabaseManager.save_transfers expects"""
+        uploads = getattr(item, "uploads", None)
+        return (
+            item.journal_id,
+            "archive" if uploads is not None else "file",
+            item.local_path,
+            item.folder_name,
+            json.dumps(uploads) if uploads is not None else None,
+            json.dumps(item.options),
+            state,
+            done,
+            item.size,
+            item.error
+        )
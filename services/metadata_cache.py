@@ -0,0 +1,72 @@
+import posixpath
+import threading
+import time
+
+# Kinds of cached remote metadata
+FOLDER = "folder"      # Folder is known to exist
+FOLDERS = "folders"    # Names of the folders under the remote root
+LISTING = "listing"    # Entries of a folder
+STAT = "stat"          # Size and mtime of a file
+
+
+class MetadataCache:
+    """TTL cache of remote folder existence, directory listings and file stats
+
+    Entries expire after ttl seconds. Our own writes invalidate exactly the paths
+    they touch, so the cache never hides a change made through this client.
+    """
+    def __init__(self, ttl):
+        """Initialize an empty cache"""
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, path):
+        """Return (True, value) for a fresh entry, otherwise (False, None)"""
+        with self._lock:
+            entry = self._entries.get((kind, path))
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self.hits += 1
+                    return True, value
+                del self._entries[(kind, path)]
+            self.misses += 1
+            return False, None
+
+    def put(self, kind, path, value, ttl=None):
+        """Store a value for ttl seconds (defaults to the cache TTL)"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(kind, path)] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, kind, path):
+        """Drop a single entry"""
+        with self._lock:
+            self._entries.pop((kind, path), None)
+
+    def invalidate_file(self, file_path):
+        """Drop everything that describes a file: its stat and its folder listing"""
+        with self._lock:
+            self._entries.pop((STAT, file_path), None)
+            self._entries.pop((LISTING, posixpath.dirname(file_path)), None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit and miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,58 @@
+import threading
+import time
+from datetime import datetime
+
+FLUSH_INTERVAL = 5.0  # Seconds a recorded metric may wait before it is written
+BATCH_SIZE = 50  # Metrics that are written at once without waiting
+
+
+class MetricsRecorder:
+    """Collects duration, bytes, throughput, retries and channels of finished operations
+
+    record() is called by SSHClient on whichever thread finished the
+    operation. Rows are buffered and written with one insert once BATCH_SIZE
+    have piled up or the oldest is FLUSH_INTERVAL old, on the thread that
+    records the last one; DatabaseManager gives every thread its own
+    connection, so this never waits for the UI.
+    """
+    def __init__(self, db_manager, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE):
+        """Initialize an empty buffer on top of a DatabaseManager"""
+        self.db_manager = db_manager
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def record(self, kind, folder_name, name, stats, success=True):
+        """Record a transfer from its TransferProgress stats"""
+        throughput = stats["avg_rate"] if stats["bytes"] else None
+        self._add((
+            kind, folder_name, name, stats["bytes"], None, stats["duration"], throughput,
+            stats["retries"], stats["channels"], int(success)
+        ))
+
+    def record_listing(self, folder_name, items, duration):
+        """Record a remote directory listing"""
+        self._add(("listing", folder_name, None, 0, items, duration, None, 0, 1, 1))
+
+    def flush(self):
+        """Write everything buffered; returns (success, error)"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._oldest = None
+        if not pending:
+            return True, None
+        return self.db_manager.record_metrics(pending)
+
+    def _add(self, row):
+        """Buffer a row, flushing when the batch is full or old enough"""
+        now = time.monotonic()
+        recorded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._pending.append(row + (recorded_at,))
+            if self._oldest is None:
+                self._oldest = now
+            due = len(self._pending) >= self.batch_size or now - self._oldest >= self.flush_interval
+        if due:
+            self.flush()
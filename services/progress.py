@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+
+RATE_WINDOW = 5.0  # Seconds the moving-average rate covers
+SAMPLE_INTERVAL = 0.1  # Seconds between stored rate samples
+PEAK_MIN_SPAN = 1.0  # Shortest span a peak rate is measured over
+
+
+class TransferProgress:
+    """Byte counter for one transfer with a moving-average rate and an ETA
+
+    add() may be called from any thread, including several channels of one
+    chunked transfer at once. Readers take snapshot() on their own schedule,
+    so a transfer never waits for the UI.
+    """
+    def __init__(self, total=0, window=RATE_WINDOW):
+        """Initialize an idle counter for total bytes"""
+        self.total = total
+        self.window = window
+        self.done = 0
+        self.started = None
+        self.finished = None
+        self.peak_rate = 0.0
+        self.channels = 1  # SFTP channels the transfer runs over
+        self.retries = 0
+        self._initial = 0
+        self._samples = deque()  # (time, bytes done), one per SAMPLE_INTERVAL
+        self._lock = threading.Lock()
+
+    def start(self, total=None, done=0):
+        """Start timing; done counts bytes kept from an earlier attempt"""
+        with self._lock:
+            now = time.monotonic()
+            if total is not None:
+                self.total = total
+            self.done = self._initial = done
+            self.started = now
+            self.finished = None
+            self._samples = deque([(now, done)])
+
+    def add(self, count):
+        """Count bytes moved"""
+        with self._lock:
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+                self._samples.append((now, self.done))
+            self.done += count
+
+            if now - self._samples[-1][0] >= SAMPLE_INTERVAL:
+                self._samples.append((now, self.done))
+                # Keep one sample at or past the window edge so the average spans all of it
+                while len(self._samples) > 2 and self._samples[1][0] <= now - self.window:
+                    self._samples.popleft()
+
+                first_time, first_done = self._samples[0]
+                if now - first_time >= PEAK_MIN_SPAN:
+                    self.peak_rate = max(self.peak_rate, (self.done - first_done) / (now - first_time))
+
+    def retry(self):
+        """Count a retried block or range"""
+        with self._lock:
+            self.retries += 1
+
+    def finish(self):
+        """Stop timing; later calls keep the first end time"""
+        with self._lock:
+            if self.finished is not None:
+                return
+            self.finished = time.monotonic()
+            if self.started is None:
+                self.started = self.finished
+
+    def snapshot(self):
+        """Current state: bytes done and total, fraction, rate (bytes/s), ETA and elapsed seconds
+
+        eta is None while the rate is unknown.
+        """
+        with self._lock:
+            now = self.finished or time.monotonic()
+            elapsed = now - self.started if self.started is not None else 0.0
+            done = min(self.done, self.total) if self.total else self.done
+
+            if self.finished:
+                rate = (self.done - self._initial) / elapsed if elapsed > 0 else 0.0
+            elif self._samples and now > self._samples[0][0]:
+                first_time, first_done = self._samples[0]
+                rate = (self.done - first_done) / (now - first_time)
+            else:
+                rate = 0.0
+
+            if self.finished or (self.total and done >= self.total):
+                eta = 0.0
+            elif rate > 0 and self.total:
+                eta = (self.total - done) / rate
+            else:
+                eta = None
+
+            return {
+                "done": done,
+                "total": self.total,
+                "fraction": done / self.total if self.total else (1.0 if self.finished else 0.0),
+                "rate": rate,
+                "eta": eta,
+                "elapsed": elapsed,
+            }
+
+    def stats(self):
+        """Summary of the transfer: duration, bytes, average and peak rate (bytes/s), channels and retries"""
+        with self._lock:
+            end = self.finished or time.monotonic()
+            duration = end - self.started if self.started is not None else 0.0
+            transferred = self.done - self._initial
+            avg_rate = transferred / duration if duration > 0 else 0.0
+            return {
+                "duration": duration,
+                "bytes": transferred,
+                "avg_rate": avg_rate,
+                # Transfers shorter than PEAK_MIN_SPAN have no separate peak
+                "peak_rate": max(self.peak_rate, avg_rate),
+                "channels": self.channels,
+                "retries": self.retries,
+            }
+
+
+def combined_snapshot(progresses):
+    """Add up the snapshots of several running transfers
+
+    The rates of parallel transfers add up; the ETA is the time until the
+    remaining bytes of all of them are done at that combined rate.
+    """
+    done = total = rate = 0
+    for progress in progresses:
+        snapshot = progress.snapshot()
+        done += snapshot["done"]
+        total += snapshot["total"]
+        rate += snapshot["rate"]
+
+    eta = (total - done) / rate if rate > 0 else None
+    return {
+        "done": done,
+        "total": total,
+        "fraction": done / total if total else 0.0,
+        "rate": rate,
+        "eta": eta,
+    }
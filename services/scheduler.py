@@ -0,0 +1,102 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"  # Listings, stats and previews the user is waiting on
+NORMAL = "normal"            # Downloads the user asked for
+BULK = "bulk"                # Queued uploads running in the background
+PRIORITY_CLASSES = (INTERACTIVE, NORMAL, BULK)
+
+_local = threading.local()
+
+
+def current_priority():
+    """Priority class of the work running on this thread"""
+    return getattr(_local, "priority", NORMAL)
+
+
+@contextmanager
+def priority(priority_class):
+    """Run a with block in a priority class; SFTP channels and bandwidth follow it"""
+    previous = current_priority()
+    _local.priority = priority_class
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class TokenBucket:
+    """Blocking byte-rate limiter that allows bursts of up to one second of traffic"""
+    def __init__(self, rate):
+        """Initialize a full bucket refilled at rate bytes per second"""
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """Wait until amount bytes may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                # Chunks larger than the bucket go through once it is full
+                needed = min(amount, self.rate)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class TransferScheduler:
+    """Runs remote work in priority classes, each on its own worker threads
+
+    Separate workers per class mean an interactive request never waits in line
+    behind bulk transfers for a thread; SFTPSessionPool does the same for
+    channels by reserving some for the interactive class. Classes with a
+    bandwidth cap are slowed down through throttle().
+    """
+    def __init__(self, workers, bandwidth_caps=None):
+        """Initialize with worker counts and optional bytes/second caps per class"""
+        self._executors = {
+            priority_class: ThreadPoolExecutor(
+                max_workers=max(1, workers.get(priority_class, 1)),
+                thread_name_prefix=f"sched-{priority_class}"
+            )
+            for priority_class in PRIORITY_CLASSES
+        }
+        self._buckets = {
+            priority_class: TokenBucket(rate)
+            for priority_class, rate in (bandwidth_caps or {}).items() if rate and rate > 0
+        }
+
+    def submit(self, priority_class, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the workers of a priority class and return a future"""
+        return self._executors[priority_class].submit(self._run, priority_class, fn, args, kwargs)
+
+    def is_capped(self, priority_class=None):
+        """Check whether a class (default: the current thread's) has a bandwidth cap"""
+        return (priority_class or current_priority()) in self._buckets
+
+    def throttle(self, amount):
+        """Account for amount bytes sent or received by the current thread's class"""
+        bucket = self._buckets.get(current_priority())
+        if bucket is not None:
+            bucket.consume(amount)
+
+    def shutdown(self):
+        """Drop pending work in every class"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run(priority_class, fn, args, kwargs):
+        """Run fn inside its priority class"""
+        with priority(priority_class):
+            return fn(*args, **kwargs)
@@ -0,0 +1,259 @@
+import threading
+import time
+from contextlib import contextmanager
+from .scheduler import INTERACTIVE, current_priority
+
+
+class SFTPSessionPool:
+    """Pool of warm SFTP channels spread over one or more SSH transports
+
+    Channels are health-checked when borrowed and replaced when broken. A
+    background thread watches the transports, reconnects dead ones and keeps
+    min_idle channels open, so callers rarely pay for a handshake themselves.
+
+    The last `reserved` channels can only be borrowed by the interactive
+    priority class, and interactive borrowers are served before anyone else,
+    so a preview or listing never waits for bulk transfers to finish.
+
+    Interactive borrowers give up after borrow_timeout. Everyone else waits
+    for as long as channels are in use, since those come back when the
+    transfers holding them finish; they only time out when nothing is
+    borrowed and still no channel can be had.
+    """
+    def __init__(self, connect, max_channels, transports=1, min_idle=1,
+                 check_interval=15, borrow_timeout=60, reserved=0):
+        """Initialize the pool with a factory for connected paramiko clients"""
+        self.connect = connect
+        self.max_channels = max(1, max_channels)
+        self.min_idle = min(min_idle, self.max_channels)
+        self.reserved = max(0, min(reserved, self.max_channels - 1))
+        self.check_interval = check_interval
+        self.borrow_timeout = borrow_timeout
+
+        self._clients = [None] * max(1, transports)
+        self._client_locks = [threading.Lock() for _ in self._clients]
+        self._channel_counts = [0] * len(self._clients)
+        self._channel_owner = {}
+        self._idle = []
+        self._total = 0
+        self._shared = set()  # Channels borrowed outside the interactive class
+        self._shared_slots = 0
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stop = threading.Event()
+        self._maintainer = None
+
+    def start(self):
+        """Start background health checks and channel warm-up"""
+        if self._maintainer is None or not self._maintainer.is_alive():
+            self._stop.clear()
+            self._maintainer = threading.Thread(target=self._maintain, name="sftp-pool", daemon=True)
+            self._maintainer.start()
+
+    def client(self, index=0):
+        """Get a connected paramiko client for a transport, reconnecting if needed"""
+        with self._client_locks[index]:
+            client = self._clients[index]
+            if client is not None and self._transport_active(client):
+                return client
+
+            if client is not None:
+                self._drop_transport(index)
+
+            client = self.connect()
+            self._clients[index] = client
+            return client
+
+    @contextmanager
+    def session(self, priority_class=None):
+        """Borrow an SFTP channel for the duration of a with block"""
+        sftp = self.acquire(priority_class)
+        try:
+            yield sftp
+        except Exception as e:
+            # SFTP status errors (missing file etc.) leave the channel usable
+            self.release(sftp, broken=not isinstance(e, OSError))
+            raise
+        else:
+            self.release(sftp)
+
+    def acquire(self, priority_class=None):
+        """Take a healthy channel, opening a new one if the pool has room
+
+        priority_class defaults to the class of the calling thread.
+        """
+        interactive = (priority_class or current_priority()) == INTERACTIVE
+        deadline = time.monotonic() + self.borrow_timeout
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise IOError("SFTP session pool is closed")
+
+                    if interactive or self._shared_available():
+                        while self._idle:
+                            sftp = self._idle.pop()
+                            if self._channel_healthy(sftp):
+                                if not interactive:
+                                    self._shared.add(id(sftp))
+                                return sftp
+                            self._forget_channel(sftp)
+
+                        if self._total < self.max_channels:
+                            self._total += 1  # Reserve a slot before connecting
+                            if not interactive:
+                                self._shared_slots += 1
+                            break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if interactive or self._total == len(self._idle):
+                            raise IOError("Timed out waiting for a free SFTP session")
+                        # Busy, not broken: the channels in use will be released
+                        deadline = time.monotonic() + self.borrow_timeout
+                        remaining = self.borrow_timeout
+                    self._cond.wait(remaining)
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+
+        try:
+            sftp = self._open_channel()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                if not interactive:
+                    self._shared_slots -= 1
+                self._cond.notify_all()
+            raise
+
+        if not interactive:
+            with self._cond:
+                self._shared_slots -= 1
+                self._shared.add(id(sftp))
+        return sftp
+
+    def release(self, sftp, broken=False):
+        """Return a borrowed channel to the pool"""
+        with self._cond:
+            self._shared.discard(id(sftp))
+            if broken or self._closed or not self._channel_healthy(sftp):
+                self._forget_channel(sftp)
+            else:
+                self._idle.append(sftp)
+            # Waiters differ in what they may take, so wake them all
+            self._cond.notify_all()
+
+    def shared_capacity(self):
+        """Most channels non-interactive borrowers can hold at once"""
+        return self.max_channels - self.reserved
+
+    def stats(self):
+        """Current pool occupancy"""
+        with self._cond:
+            return {
+                "open": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "in_use_shared": len(self._shared) + self._shared_slots,
+                "transports": sum(1 for client in self._clients if client is not None),
+            }
+
+    def close(self):
+        """Close every channel and transport"""
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            for sftp in idle:
+                self._forget_channel(sftp)
+            self._cond.notify_all()
+
+        for index in range(len(self._clients)):
+            with self._client_locks[index]:
+                self._drop_transport(index)
+
+    def _shared_available(self):
+        """Check whether a non-interactive borrower may take a channel (caller holds the lock)"""
+        if self._interactive_waiting:
+            return False
+        return len(self._shared) + self._shared_slots < self.max_channels - self.reserved
+
+    def _open_channel(self):
+        """Open a channel on the transport that carries the fewest channels"""
+        with self._cond:
+            index = min(range(len(self._clients)), key=lambda i: self._channel_counts[i])
+            self._channel_counts[index] += 1
+
+        try:
+            sftp = self.client(index).open_sftp()
+        except Exception:
+            with self._cond:
+                self._channel_counts[index] -= 1
+            raise
+
+        with self._cond:
+            self._channel_owner[id(sftp)] = index
+        return sftp
+
+    def _forget_channel(self, sftp):
+        """Close a channel and free its slot (caller holds the lock)"""
+        index = self._channel_owner.pop(id(sftp), None)
+        if index is not None:
+            self._channel_counts[index] -= 1
+        self._total -= 1
+        try:
+            sftp.close()
+        except Exception:
+            pass
+
+    def _drop_transport(self, index):
+        """Close a transport (caller holds its client lock)"""
+        client = self._clients[index]
+        self._clients[index] = None
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _transport_active(client):
+        """Check whether a paramiko client's transport is up"""
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+
+    @staticmethod
+    def _channel_healthy(sftp):
+        """Check whether an SFTP channel can still carry requests"""
+        channel = sftp.get_channel()
+        return (channel is not None and not channel.closed
+                and channel.get_transport() is not None and channel.get_transport().is_active())
+
+    def _maintain(self):
+        """Background loop: drop dead channels, reconnect and pre-open channels"""
+        while not self._stop.is_set():
+            try:
+                with self._cond:
+                    for sftp in [s for s in self._idle if not self._channel_healthy(s)]:
+                        self._idle.remove(sftp)
+                        self._forget_channel(sftp)
+                    missing = min(self.min_idle - len(self._idle), self.max_channels - self._total)
+                    self._total += max(0, missing)
+
+                # Opening channels reconnects dead transports as a side effect
+                for _ in range(max(0, missing)):
+                    try:
+                        sftp = self._open_channel()
+                    except Exception:
+                        with self._cond:
+                            self._total -= 1
+                        continue
+                    self.release(sftp)
+            except Exception:
+                pass  # Never let the maintainer die; the next round tries again
+
+            self._stop.wait(self.check_interval)
@@ -1,6 +1,77 @@
+import functools
+import hashlib
+import inspect
 import os
+import threading
+import uuid
 import paramiko
 import stat
+import time
+from collections import namedtuple
+from config import CHUNKED_UPLOAD_THRESHOLD, CHUNK_SIZE, UPLOAD_CHANNELS
+from config import CHUNKED_DOWNLOAD_THRESHOLD, DOWNLOAD_CHANNELS
+from config import SFTP_POOL_SIZE, SFTP_POOL_MIN_IDLE, SSH_TRANSPORTS, KEEPALIVE_INTERVAL
+from config import SFTP_RESERVED_INTERACTIVE, ASYNC_WORKERS, TRANSFER_WORKERS
+from config import INTERACTIVE_BANDWIDTH_CAP, NORMAL_BANDWIDTH_CAP, BULK_BANDWIDTH_CAP
+from config import METADATA_CACHE_TTL, TRANSFER_PROFILE
+from config import COMPRESSION_MODE, COMPRESSION_MIN_RATIO, COMPRESSION_MIN_SIZE
+from config import TRANSFER_RETRIES, RETRY_BACKOFF, VERIFY_UPLOADS
+from config import DELTA_MIN_SIZE, DELTA_BLOCK_SIZE, DELTA_MAX_CHANGED, SIGNATURE_DIR
+from .chunked_transfer import ChunkedUploader, ChunkedDownloader, HashingReader, BLOCK_SIZE, read_blocks, with_retries, prefix_digest, finalize_remote_file
+from .delta import BlockSignature, SignatureHasher, SignatureStore, compute_delta
+from .session_pool import SFTPSessionPool
+from .metadata_cache import MetadataCache, FOLDER, FOLDERS, LISTING, STAT
+from .compression import should_compress
+from .archive import HashingWriter, write_archive
+from .scheduler import TransferScheduler, INTERACTIVE, NORMAL, BULK
+from .tuning import TuningProfile, PROFILES, auto_tune, read_ahead_bytes
+from .progress import TransferProgress
+
+# Compact record of one directory entry from a bulk listing
+RemoteEntry = namedtuple("RemoteEntry", ["name", "size", "mtime", "type"])
+
+# Byte ranges per remote copy command, keeps command lines well under shell limits
+COPY_RANGES_PER_COMMAND = 100
+
+# Longest batched mkdir command; cmd.exe accepts at most 8191 characters
+MKDIR_COMMAND_LENGTH = 7000
+
+
+def measured(kind, subject):
+    """Report the stats of an SSHClient transfer method to client.metrics
+
+    subject(arguments) names the (folder_name, name) a call works on, from a
+    dict of the call's arguments by parameter name, however they were passed.
+    The method takes progress as a keyword argument; one is created when the
+    caller passes none, so every call can be measured. Recording never fails
+    a transfer: errors while measuring are ignored.
+    """
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, progress=None, **kwargs):
+            progress = progress or TransferProgress()
+            result, error = method(self, *args, progress=progress, **kwargs)
+            if self.metrics:
+                try:
+                    progress.finish()
+                    folder_name, name = subject(signature.bind(self, *args, **kwargs).arguments)
+                    # Server-side copies move no data and would drag the upload rates down
+                    copied = isinstance(result, dict) and result.get("copied_from")
+                    self.metrics.record("copy" if copied else kind, folder_name, name, progress.stats(), error is None)
+                except Exception:
+                    pass
+            return result, error
+        return wrapper
+    return decorate
+
+
+def _archive_subject(arguments):
+    """Folder and name an archive upload is recorded under"""
+    uploads = arguments["uploads"]
+    folders = {folder_name for _, folder_name in uploads}
+    return (folders.pop() if len(folders) == 1 else None), f"{len(uploads)} files"
 
 class SSHClient:
     def __init__(self, host, port, username, password, remote_dir):
@@ -11,67 +82,165 @@ class SSHClient:
         self.password = password
         self.remote_dir = remote_dir
         self.client = None
-        self.sftp = None
+        self.pool = None
+        self.compressed_pool = None
+        self.remote_os = None
+        self.signatures = SignatureStore(SIGNATURE_DIR)
+        self.cache = MetadataCache(METADATA_CACHE_TTL)
+        self.scheduler = TransferScheduler(
+            {INTERACTIVE: ASYNC_WORKERS, NORMAL: ASYNC_WORKERS, BULK: TRANSFER_WORKERS},
+            {INTERACTIVE: INTERACTIVE_BANDWIDTH_CAP, NORMAL: NORMAL_BANDWIDTH_CAP, BULK: BULK_BANDWIDTH_CAP}
+        )
+        # paramiko's own sizes until connect() picks a profile
+        self.tuning = TuningProfile(
+            "default", paramiko.common.DEFAULT_WINDOW_SIZE, paramiko.common.DEFAULT_MAX_PACKET_SIZE,
+            CHUNK_SIZE, None
+        )
+        self._tuned = False
+        self._connect_lock = threading.Lock()
+        # Set by close(); keeps background work from quietly reconnecting afterwards
+        self._closed = False
+        # Receives the stats of finished transfers and listings (a MetricsRecorder), if set
+        self.metrics = None
+    
+    def _new_transport(self, compress=False):
+        """Open and authenticate one SSH transport with keepalives enabled"""
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            self.host, 
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            compress=compress
+        )
+        client.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+        self._apply_tuning(client)
+        return client
+    
+    def _apply_tuning(self, client):
+        """Use the tuned window and packet sizes for channels opened from now on"""
+        transport = client.get_transport()
+        transport.default_window_size = self.tuning.window_size
+        transport.default_max_packet_size = self.tuning.max_packet_size
+    
+    def _tune(self):
+        """Pick the transfer profile once, measuring the link in auto mode"""
+        if TRANSFER_PROFILE in PROFILES:
+            self.tuning = PROFILES[TRANSFER_PROFILE]
+        elif TRANSFER_PROFILE == "auto":
+            # A throwaway channel, so pooled ones are opened with the tuned sizes
+            sftp = self.client.open_sftp()
+            try:
+                self.tuning = auto_tune(sftp, self.remote_dir)
+            finally:
+                sftp.close()
+        self._apply_tuning(self.client)
+        self._tuned = True
     
     def connect(self):
-        """Establish SSH connection"""
-        try:
-            self.client = paramiko.SSHClient()
-            self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.client.connect(
-                self.host, 
-                port=self.port,
-                username=self.username,
-                password=self.password
-            )
-            
-            print(self.client)
-            # Check if the remote directory exists
+        """Establish SSH connection
+        
+        The first transport is connected right away so errors surface here. On
+        the first connect the transfer profile is chosen (see TRANSFER_PROFILE;
+        "auto" measures round-trip time and throughput) and recorded in
+        self.tuning; the session pool then warms up SFTP channels in the background.
+        Connecting again after close() is only possible through this method.
+        """
+        try:
+            with self._connect_lock:
+                self._closed = False
+                if self.pool is None:
+                    self.pool = SFTPSessionPool(
+                        self._new_transport,
+                        SFTP_POOL_SIZE,
+                        transports=SSH_TRANSPORTS,
+                        min_idle=SFTP_POOL_MIN_IDLE,
+                        check_interval=KEEPALIVE_INTERVAL,
+                        reserved=SFTP_RESERVED_INTERACTIVE
+                    )
+                
+                self.client = self.pool.client()
+                if not self._tuned:
+                    self._tune()
+                self.pool.start()
             return True, None
         except Exception as e:
             error_msg = f"SSH Connection Error: {str(e)}"
             return False, error_msg
     
-    def open_sftp(self):
-        """Open SFTP connection"""
-        if not self.client:
-            success, error = self.connect()
+    def _reconnect(self):
+        """Connect on demand for an operation, unless the client was closed"""
+        if self._closed:
+            return False, "SSH client is closed"
+        return self.connect()
+    
+    def session(self):
+        """Borrow a pooled SFTP channel: with ssh_client.session() as sftp: ..."""
+        if self._closed:
+            raise IOError("SSH client is closed")
+        if not self.pool:
+            success, error = self._reconnect()
             if not success:
-                return False, error
-        
-        try:
-            self.sftp = self.client.open_sftp()
-            return True, None
-        except Exception as e:
-            error_msg = f"SFTP Connection Error: {str(e)}"
-            return False, error_msg
+                raise IOError(error)
+        return self.pool.session()
+    
+    def compressed_session(self):
+        """Borrow an SFTP channel on a dedicated zlib-compressed transport"""
+        if self._closed:
+            raise IOError("SSH client is closed")
+        with self._connect_lock:
+            if self.compressed_pool is None:
+                # Opened on first use; falls back to no compression if the server has none
+                self.compressed_pool = SFTPSessionPool(
+                    lambda: self._new_transport(compress=True),
+                    UPLOAD_CHANNELS,
+                    min_idle=0,
+                    check_interval=KEEPALIVE_INTERVAL
+                )
+                self.compressed_pool.start()
+        return self.compressed_pool.session()
+    
+    def is_connected(self):
+        """Check whether the SSH transport is still up"""
+        transport = self.client.get_transport() if self.client else None
+        return transport is not None and transport.is_active()
     
     def close(self):
-        """Close SSH and SFTP connections"""
-        if self.sftp:
+        """Close SSH and SFTP connections
+        
+        Operations still running fail from here on instead of reconnecting;
+        only an explicit connect() opens the client again.
+        """
+        self._closed = True
+        if self.compressed_pool:
             try:
-                self.sftp.close()
+                self.compressed_pool.close()
             except:
                 pass
             finally:
-                self.sftp = None
+                self.compressed_pool = None
         
-        if self.client:
+        if self.pool:
             try:
-                self.client.close()
+                self.pool.close()
             except:
                 pass
             finally:
-                self.client = None
+                self.pool = None
+        
+        self.client = None
     
     def execute_command(self, command):
         """Execute a command on the remote server"""
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return None, error, -1
         
         try:
+            # Reconnects transparently if the transport died since the last call
+            self.client = self.pool.client()
             stdin, stdout, stderr = self.client.exec_command(command)
             exit_status = stdout.channel.recv_exit_status()
             output = stdout.read().decode().strip()
@@ -81,31 +250,236 @@ class SSHClient:
         except Exception as e:
             return None, str(e), -1
     
+    def detect_remote_os(self):
+        """Detect whether the server runs Windows or a POSIX shell"""
+        if self.remote_os:
+            return self.remote_os
+        
+        output, error, exit_status = self.execute_command("ver")
+        if exit_status == 0 and output and "windows" in output.lower():
+            self.remote_os = "windows"
+        else:
+            self.remote_os = "posix"
+        return self.remote_os
+    
+    def remote_hash(self, remote_path, length=None):
+        """Compute the SHA-256 of a remote file on the server itself
+        
+        With length only the first length bytes are hashed.
+        """
+        try:
+            if self.detect_remote_os() == "windows":
+                windows_path = remote_path.replace("/", "\\")
+                if length is None:
+                    output, error, exit_status = self.execute_command(f'certutil -hashfile "{windows_path}" SHA256')
+                    if exit_status != 0 or not output:
+                        return None, error or "certutil failed"
+                    # Second line holds the digest; older versions separate bytes with spaces
+                    lines = output.splitlines()
+                    digest = lines[1].replace(" ", "").strip().lower() if len(lines) > 1 else ""
+                else:
+                    # certutil can only hash whole files
+                    output, error, exit_status = self.execute_command(
+                        'powershell -NoProfile -Command "'
+                        f"$f=[IO.File]::OpenRead('{windows_path}');"
+                        "$h=[Security.Cryptography.SHA256]::Create();"
+                        "$b=New-Object byte[] 1048576;"
+                        f"$n=[long]{length};"
+                        "while($n -gt 0){$k=$f.Read($b,0,[Math]::Min($n,$b.Length));"
+                        "if($k -le 0){exit 1};[void]$h.TransformBlock($b,0,$k,$null,0);$n-=$k};"
+                        "[void]$h.TransformFinalBlock($b,0,0);$f.Close();"
+                        "[BitConverter]::ToString($h.Hash).Replace('-','')\""
+                    )
+                    if exit_status != 0 or not output:
+                        return None, error or "powershell failed"
+                    digest = output.strip().lower()
+            else:
+                if length is None:
+                    command = f'sha256sum "{remote_path}"'
+                else:
+                    command = f'head -c {length} "{remote_path}" | sha256sum'
+                output, error, exit_status = self.execute_command(command)
+                if exit_status != 0 or not output:
+                    return None, error or "sha256sum failed"
+                digest = output.split()[0].lower()
+            
+            if len(digest) != 64:
+                return None, f"Unexpected hash output: {output}"
+            return digest, None
+        except Exception as e:
+            return None, str(e)
+    
+    def remote_copy(self, source_path, target_path):
+        """Copy a file on the server without sending it over the network"""
+        if self.detect_remote_os() == "windows":
+            source_path = source_path.replace("/", "\\")
+            target_path = target_path.replace("/", "\\")
+            command = f'copy /Y "{source_path}" "{target_path}"'
+        else:
+            command = f'cp -f "{source_path}" "{target_path}"'
+        
+        output, error, exit_status = self.execute_command(command)
+        if exit_status != 0:
+            return False, error or output
+        return True, None
+    
+    def _remote_copy_ranges(self, source_path, target_path, ranges):
+        """Copy (src_offset, dst_offset, length) ranges between two files on the server"""
+        windows = self.detect_remote_os() == "windows"
+        
+        for start in range(0, len(ranges), COPY_RANGES_PER_COMMAND):
+            batch = ranges[start:start + COPY_RANGES_PER_COMMAND]
+            
+            if windows:
+                offsets = ",".join(f"{src},{dst},{length}" for src, dst, length in batch)
+                command = (
+                    'powershell -NoProfile -Command "'
+                    f"$s=[IO.File]::OpenRead('{source_path}');"
+                    f"$d=[IO.File]::Open('{target_path}','Open','Write');"
+                    "$b=New-Object byte[] 1048576;"
+                    f"$r=[long[]]@({offsets});"
+                    "for($i=0;$i -lt $r.Length;$i+=3){"
+                    "$s.Position=$r[$i];$d.Position=$r[$i+1];$n=$r[$i+2];"
+                    "while($n -gt 0){$k=$s.Read($b,0,[Math]::Min($n,$b.Length));"
+                    "if($k -le 0){exit 1};$d.Write($b,0,$k);$n-=$k}};"
+                    '$s.Close();$d.Close()"'
+                )
+            else:
+                command = " && ".join(
+                    f'dd if="{source_path}" of="{target_path}" bs=1M conv=notrunc status=none '
+                    f"iflag=skip_bytes,count_bytes oflag=seek_bytes skip={src} seek={dst} count={length}"
+                    for src, dst, length in batch
+                )
+            
+            output, error, exit_status = self.execute_command(command)
+            if exit_status != 0:
+                return False
+        return True
+    
     def create_folder(self, folder_name):
         """Create a folder on the remote server"""
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return False, error
         
         remote_folder_path = os.path.join(self.remote_dir, folder_name).replace("\\", "/")
         
+        # Skip the remote command for folders we know exist
+        known, _ = self.cache.get(FOLDER, remote_folder_path)
+        if known:
+            return True, remote_folder_path
+        
         try:
-            # Windows command to create directory
-            output, error, exit_status = self.execute_command(f'mkdir "{remote_folder_path}"')
+            # Windows mkdir reports folders that exist; POSIX needs -p to accept them
+            prefix = "mkdir" if self.detect_remote_os() == "windows" else "mkdir -p"
+            output, error, exit_status = self.execute_command(f'{prefix} "{remote_folder_path}"')
             
             # Check if the folder creation was successful or if the folder already exists
             if exit_status == 0 or "already exists" in error.lower():
+                self.cache.put(FOLDER, remote_folder_path, True)
+                if exit_status == 0:
+                    self.cache.invalidate(FOLDERS, self.remote_dir)
                 return True, remote_folder_path
             else:
                 return False, error
         except Exception as e:
             return False, str(e)
     
-    def list_folders(self):
+    def create_folders(self, folder_names):
+        """Create many (nested) folders with as few remote commands as possible
+        
+        Only the deepest folders are passed to mkdir, which creates their parents
+        too, and they are packed into commands of up to MKDIR_COMMAND_LENGTH
+        characters. Folders that already exist are fine; success is checked by
+        listing the parents of those folders afterwards. Returns the number of
+        mkdir commands run.
+        """
+        if not self.client:
+            success, error = self._reconnect()
+            if not success:
+                return 0, error
+        
+        # Every folder and all of its parents end up existing
+        wanted = set()
+        for folder_name in folder_names:
+            parts = folder_name.strip("/").split("/")
+            for depth in range(1, len(parts) + 1):
+                wanted.add("/".join(parts[:depth]))
+        
+        paths = {
+            name: os.path.join(self.remote_dir, name).replace("\\", "/")
+            for name in wanted
+        }
+        missing = {name for name in wanted if not self.cache.get(FOLDER, paths[name])[0]}
+        parents = {name.rsplit("/", 1)[0] for name in missing if "/" in name}
+        leaves = sorted(missing - parents)
+        if not leaves:
+            return 0, None
+        
+        try:
+            windows = self.detect_remote_os() == "windows"
+            if windows:
+                # cmd.exe mkdir fails on folders that exist, so every leaf checks first
+                prefix, separator = "", " & "
+                arguments = [
+                    f'if not exist "{path}" mkdir "{path}"'
+                    for path in (paths[name].replace("/", "\\") for name in leaves)
+                ]
+            else:
+                prefix, separator = "mkdir -p ", " "
+                arguments = [f'"{paths[name]}"' for name in leaves]
+            
+            commands = []
+            command = ""
+            for argument in arguments:
+                if command and len(prefix) + len(command) + len(separator) + len(argument) > MKDIR_COMMAND_LENGTH:
+                    commands.append(prefix + command)
+                    command = ""
+                command = f"{command}{separator}{argument}" if command else argument
+            if command:
+                commands.append(prefix + command)
+            
+            errors = []
+            for command in commands:
+                output, error, exit_status = self.execute_command(command)
+                if exit_status != 0:
+                    errors.append(error or output or "mkdir failed")
+            
+            # Judge the result by what exists, not by the shell's messages
+            by_parent = {}
+            for name in leaves:
+                parent, _, leaf = paths[name].rpartition("/")
+                by_parent.setdefault(parent, set()).add(leaf)
+            absent = []
+            with self.session() as sftp:
+                for parent, names in sorted(by_parent.items()):
+                    try:
+                        present = set(sftp.listdir(parent))
+                    except IOError:
+                        present = set()
+                    absent.extend(f"{parent}/{leaf}" for leaf in sorted(names - present))
+            if absent:
+                details = "\n".join(errors)
+                return 0, f"Could not create {', '.join(absent[:5])}" + (f": {details}" if details else "")
+            
+            for name in missing:
+                self.cache.put(FOLDER, paths[name], True)
+            if commands:
+                self.cache.invalidate(FOLDERS, self.remote_dir)
+            return len(commands), None
+        except Exception as e:
+            return 0, str(e)
+    
+    def list_folders(self, use_cache=True):
         """List all folders in the remote directory"""
+        if use_cache:
+            cached, folders = self.cache.get(FOLDERS, self.remote_dir)
+            if cached:
+                return list(folders), None
+        
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return [], error
         
@@ -115,6 +489,12 @@ class SSHClient:
             
             if exit_status == 0:
                 folders = [folder for folder in output.split('\r\n') if folder]
+                
+                # Every listed folder exists, so uploads into it need no mkdir
+                self.cache.put(FOLDERS, self.remote_dir, list(folders))
+                for folder in folders:
+                    folder_path = os.path.join(self.remote_dir, folder).replace("\\", "/")
+                    self.cache.put(FOLDER, folder_path, True)
                 return folders, None
             else:
                 return [], error
@@ -124,7 +504,7 @@ class SSHClient:
     def list_files(self, folder_name):
         """List all files in a remote folder"""
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return [], error
         
@@ -142,110 +522,646 @@ class SSHClient:
         except Exception as e:
             return [], str(e)
     
+    def list_directory(self, folder_name, use_cache=True):
+        """List a remote folder with size, mtime and type in a single SFTP readdir pass"""
+        remote_folder_path = os.path.join(self.remote_dir, folder_name).replace("\\", "/")
+        
+        if use_cache:
+            cached, entries = self.cache.get(LISTING, remote_folder_path)
+            if cached:
+                return list(entries), None
+        
+        if not self.client:
+            success, error = self._reconnect()
+            if not success:
+                return [], error
+        
+        try:
+            started = time.perf_counter()
+            with self.session() as sftp:
+                attributes = sftp.listdir_attr(remote_folder_path)
+            duration = time.perf_counter() - started
+            
+            entries = []
+            for attr in attributes:
+                if stat.S_ISDIR(attr.st_mode or 0):
+                    entry_type = "dir"
+                elif stat.S_ISLNK(attr.st_mode or 0):
+                    entry_type = "link"
+                else:
+                    entry_type = "file"
+                entries.append(RemoteEntry(attr.filename, attr.st_size or 0, attr.st_mtime or 0, entry_type))
+            
+            entries.sort(key=lambda entry: entry.name.lower())
+            self.cache.put(LISTING, remote_folder_path, list(entries))
+            self.cache.put(FOLDER, remote_folder_path, True)
+            
+            # Only listings that went to the server are measured
+            if self.metrics:
+                self.metrics.record_listing(folder_name, len(entries), duration)
+            return entries, None
+        except Exception as e:
+            return [], str(e)
+    
     def get_file_info(self, folder_name, file_name):
         """Get file information (size, modification time)"""
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return None, error
         
         remote_path = os.path.join(self.remote_dir, folder_name, file_name).replace("\\", "/")
         
+        cached, file_info = self.cache.get(STAT, remote_path)
+        if cached:
+            return dict(file_info), None
+        
+        # A fresh listing of the folder already holds the answer
+        folder_path = os.path.dirname(remote_path)
+        cached, entries = self.cache.get(LISTING, folder_path)
+        if cached:
+            for entry in entries:
+                if entry.name == file_name:
+                    return {"size": entry.size, "mtime": entry.mtime}, None
+        
         try:
-            # Open SFTP if not already open
-            if not self.sftp:
-                success, error = self.open_sftp()
-                if not success:
-                    return None, error
-            
             # Get file stats
-            file_stat = self.sftp.stat(remote_path)
+            with self.session() as sftp:
+                file_stat = sftp.stat(remote_path)
             file_size = file_stat.st_size
             file_mtime = file_stat.st_mtime
             
-            return {"size": file_size, "mtime": file_mtime}, None
+            file_info = {"size": file_size, "mtime": file_mtime}
+            self.cache.put(STAT, remote_path, file_info)
+            return dict(file_info), None
         except Exception as e:
             return None, str(e)
     
-    def upload_file(self, local_file_path, folder_name):
-        """Upload a file to a remote folder"""
+    @measured("upload", lambda call: (call["folder_name"], os.path.basename(call["local_file_path"])))
+    def upload_file(self, local_file_path, folder_name, chunked=None, resume=True, delta=True, compress=None,
+                    content_sha256=None, copy_sources=(), progress=None):
+        """Upload a file to a remote folder
+        
+        Files of at least CHUNKED_UPLOAD_THRESHOLD bytes are sent as parallel byte
+        ranges over several SFTP channels; pass chunked=True/False to force a mode.
+        Every file goes through a .part file that is renamed into place once
+        complete. From one chunk (see the transfer profile) up, resume=True
+        continues a partial upload left behind by an earlier attempt once its
+        prefix has been verified; smaller files are sent again whole.
+        
+        With delta=True a file we uploaded before is patched by sending only the
+        blocks that changed, as long as nobody else modified the remote copy.
+        
+        Data of files that compress well (judged from a sample of their first
+        blocks, see COMPRESSION_MODE) goes over a compressed transport; pass
+        compress=True/False to override.
+        
+        The file is hashed (SHA-256) while it is sent. With VERIFY_UPLOADS the
+        server hashes its copy as well and a mismatch fails the upload; both
+        digests are returned as "sha256" and "remote_sha256".
+        
+        When the caller already knows the file's SHA-256 (content_sha256) and
+        where identical content was uploaded before (copy_sources), the file is
+        copied on the server instead of sent; the source used is returned as
+        "copied_from". Sources that are gone or changed are skipped.
+        
+        Bytes sent are counted on progress (a TransferProgress, created if not
+        given) and its stats are returned as "stats".
+        """
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return None, error
         
+        progress = progress or TransferProgress()
         try:
             # Ensure the folder exists
             success, result = self.create_folder(folder_name)
             if not success:
                 return None, result
             
-            # Open SFTP if not already open
-            if not self.sftp:
-                success, error = self.open_sftp()
-                if not success:      
-                    return None, error
-            
             # Construct remote file path
             file_name = os.path.basename(local_file_path)
             remote_folder_path = os.path.join(self.remote_dir, folder_name).replace("\\", "/")
             remote_file_path = os.path.join(remote_folder_path, file_name).replace("\\", "/")
             
             # Upload file
-            self.sftp.put(local_file_path, remote_file_path)
+            local_stat = os.stat(local_file_path)
+            local_size = local_stat.st_size
+            if chunked is None:
+                chunked = local_size >= CHUNKED_UPLOAD_THRESHOLD
+            if compress is None:
+                compress = self._should_compress(local_file_path, local_size)
+            data_session = self.compressed_session if compress else self.session
+            
+            sent, remote_sha256, copied_from = None, None, None
+            if content_sha256 and copy_sources:
+                progress.start(0)
+                copied = self._server_side_copy(remote_file_path, local_size, content_sha256, copy_sources)
+                if copied:
+                    copied_from, remote_sha256 = copied
+                    sent = (0, content_sha256, None)
+            
+            if sent is None and delta and local_size >= DELTA_MIN_SIZE:
+                try:
+                    sent = self._delta_upload(local_file_path, remote_file_path, data_session, progress)
+                except Exception:
+                    sent = None  # Fall back to a full upload
+                if sent is not None:
+                    # A partial full upload from an earlier attempt is of no use any more
+                    self._discard_partial(f"{remote_file_path}.part")
+            
+            if sent is None:
+                sent = self._full_upload(local_file_path, remote_file_path, chunked, resume, data_session, progress)
+            transferred, local_sha256, signature = sent
+            progress.finish()
             
             # Get file stats for verification
-            file_stat = self.sftp.stat(remote_file_path)
+            self.cache.invalidate_file(remote_file_path)
+            with self.session() as sftp:
+                file_stat = sftp.stat(remote_file_path)
             file_size = file_stat.st_size
+            self.cache.put(STAT, remote_file_path, {"size": file_size, "mtime": file_stat.st_mtime})
+            
+            # Let the server hash what it received; no remote hash tool just means unverified
+            if VERIFY_UPLOADS and not remote_sha256:
+                remote_sha256, _ = self.remote_hash(remote_file_path)
+                if remote_sha256 and remote_sha256 != local_sha256:
+                    self.signatures.discard(remote_file_path)
+                    return None, (
+                        f"Checksum mismatch after upload of {file_name}: "
+                        f"local {local_sha256}, remote {remote_sha256}"
+                    )
+            
+            # Keep block signatures so the next upload of this file can be a delta
+            if local_size >= DELTA_MIN_SIZE and file_size == local_size:
+                self._remember_signature(local_file_path, remote_file_path, file_stat.st_mtime, signature)
             
-            return {"path": remote_file_path, "size": file_size}, None
+            return {
+                "path": remote_file_path,
+                "size": file_size,
+                "transferred": transferred,
+                "compressed": compress,
+                "sha256": local_sha256,
+                "remote_sha256": remote_sha256,
+                "copied_from": copied_from,
+                "local_mtime": local_stat.st_mtime,
+                "stats": progress.stats()
+            }, None
         except Exception as e:
             return None, str(e)
     
-    def download_file(self, folder_name, file_name, local_directory):
-        """Download a file from a remote folder"""
+    @measured("archive", _archive_subject)
+    def upload_archive(self, uploads, progress=None):
+        """Upload many small files as one streamed tar, extracted on the server
+        
+        uploads is a list of (local_file_path, folder_name) pairs. The archive
+        goes over a single SFTP channel, is hashed on the fly and (with
+        VERIFY_UPLOADS) checked against the server's hash of it before one tar
+        command unpacks it into the remote root. Sizes are then checked with one
+        listing per folder. Returns a list of per-file results shaped like
+        upload_file's; remote_sha256 is set when the archive was verified.
+        Archive bytes are counted on progress if given.
+        """
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return None, error
         
+        archive_path = os.path.join(self.remote_dir, f".upload-{uuid.uuid4().hex}.tar").replace("\\", "/")
+        members = [
+            (local_file_path, f"{folder_name.strip('/')}/{os.path.basename(local_file_path)}")
+            for local_file_path, folder_name in uploads
+        ]
+        
         try:
-            # Open SFTP if not already open
-            if not self.sftp:
-                success, error = self.open_sftp()
-                if not success:
-                    return None, error
+            # Stream the archive straight into the remote file
+            digest = hashlib.sha256()
+            progress = progress or TransferProgress()
+            progress.start(sum(os.path.getsize(local_file_path) for local_file_path, _ in members))
+            with self.session() as sftp, sftp.open(archive_path, "wb") as remote_file:
+                remote_file.set_pipelined(True)
+                written = write_archive(HashingWriter(remote_file, digest, self._byte_counter(progress)), members)
+            progress.finish()
+            
+            archive_sha256 = None
+            if VERIFY_UPLOADS:
+                archive_sha256, _ = self.remote_hash(archive_path)
+                if archive_sha256 and archive_sha256 != digest.hexdigest():
+                    return None, "Checksum mismatch on uploaded archive"
+            
+            # tar ships with Windows 10 and later as well as every Unix
+            archive_target, extract_dir = archive_path, self.remote_dir
+            if self.detect_remote_os() == "windows":
+                archive_target = archive_target.replace("/", "\\")
+                extract_dir = extract_dir.replace("/", "\\")
+            command = f'tar -xf "{archive_target}" -C "{extract_dir}"'
+            output, error, exit_status = self.execute_command(command)
+            if exit_status != 0:
+                return None, f"Remote extraction failed: {error or output}"
+        except Exception as e:
+            return None, str(e)
+        finally:
+            try:
+                with self.session() as sftp:
+                    sftp.remove(archive_path)
+            except Exception:
+                pass
+        
+        try:
+            results = []
+            listings = {}
+            for (local_file_path, folder_name), (_, arcname) in zip(uploads, members):
+                # One listing per folder instead of one stat per file
+                if folder_name not in listings:
+                    self.cache.invalidate(LISTING, os.path.join(self.remote_dir, folder_name).replace("\\", "/"))
+                    entries, error = self.list_directory(folder_name)
+                    if error:
+                        return None, error
+                    listings[folder_name] = {entry.name: entry for entry in entries}
+                
+                size, sha256, mtime = written[arcname]
+                file_name = os.path.basename(local_file_path)
+                entry = listings[folder_name].get(file_name)
+                if entry is None or entry.size != size:
+                    return None, f"{file_name} is missing or incomplete after extraction"
+                
+                remote_file_path = os.path.join(self.remote_dir, arcname).replace("\\", "/")
+                self.signatures.discard(remote_file_path)
+                results.append({
+                    "local_path": local_file_path,
+                    "folder_name": folder_name,
+                    "path": remote_file_path,
+                    "size": entry.size,
+                    "sha256": sha256,
+                    "remote_sha256": sha256 if archive_sha256 else None,
+                    "local_mtime": mtime
+                })
+            
+            self.cache.invalidate(FOLDERS, self.remote_dir)
+            return results, None
+        except Exception as e:
+            return None, str(e)
+    
+    def _server_side_copy(self, remote_file_path, local_size, content_sha256, sources):
+        """Create remote_file_path from a remote file with the same content
+        
+        Returns (source, remote_sha256) for the first source that worked, with
+        remote_sha256 None if VERIFY_UPLOADS is off, or None if none did.
+        """
+        temp_path = f"{remote_file_path}.part"
+        
+        for source_path in sources:
+            if source_path == remote_file_path:
+                continue
+            
+            # Cheap check first: the source must still exist with the right size
+            try:
+                with self.session() as sftp:
+                    if sftp.stat(source_path).st_size != local_size:
+                        continue
+            except IOError:
+                continue
+            
+            success, _ = self.remote_copy(source_path, temp_path)
+            if not success:
+                continue
+            
+            # The index can be out of date, so check the copy before publishing it
+            remote_sha256 = None
+            if VERIFY_UPLOADS:
+                remote_sha256, _ = self.remote_hash(temp_path)
+                if remote_sha256 != content_sha256:
+                    with self.session() as sftp:
+                        sftp.remove(temp_path)
+                    continue
+            
+            with self.session() as sftp:
+                finalize_remote_file(sftp, temp_path, remote_file_path)
+            return source_path, remote_sha256
+        return None
+    
+    def _should_compress(self, local_file_path, local_size):
+        """Pick compression for an upload according to COMPRESSION_MODE"""
+        if COMPRESSION_MODE == "always":
+            return True
+        if COMPRESSION_MODE == "never" or local_size < COMPRESSION_MIN_SIZE:
+            return False
+        return should_compress(local_file_path, COMPRESSION_MIN_RATIO)
+    
+    def _full_upload(self, local_file_path, remote_file_path, chunked, resume, session, progress):
+        """Send the whole file over channels from session()
+        
+        Returns the bytes sent, the SHA-256 of the local file and its block
+        signature (None for files too small for deltas), all computed from the
+        same reads that feed the upload.
+        """
+        local_size = os.path.getsize(local_file_path)
+        
+        if not chunked and local_size < self.tuning.chunk_size:
+            # Too small to resume; any .part left by an earlier attempt is simply overwritten
+            temp_path = f"{remote_file_path}.part"
             
+            def send():
+                digest = self._upload_digest(local_size)
+                progress.start(local_size)
+                with session() as sftp, open(local_file_path, "rb") as local_file:
+                    sftp.putfo(
+                        HashingReader(local_file, digest),
+                        temp_path,
+                        file_size=local_size,
+                        callback=self._put_callback(progress)
+                    )
+                    finalize_remote_file(sftp, temp_path, remote_file_path)
+                return digest
+            
+            digest = with_retries(send, TRANSFER_RETRIES, RETRY_BACKOFF, progress.retry)
+            return local_size, digest.hexdigest(), self._built_signature(digest)
+        
+        channels = self._channel_fan_out(UPLOAD_CHANNELS) if chunked else 1
+        start_offset, digest = 0, None
+        if resume:
+            start_offset, digest = self._upload_resume_offset(local_file_path, f"{remote_file_path}.part")
+        if digest is None:
+            digest = self._upload_digest(local_size)
+        
+        progress.start(local_size, done=start_offset)
+        progress.channels = channels
+        uploader = ChunkedUploader(
+            session, channels, self.tuning.chunk_size, TRANSFER_RETRIES, RETRY_BACKOFF,
+            throttle=self._byte_counter(progress), on_retry=progress.retry
+        )
+        transferred = uploader.upload(local_file_path, remote_file_path, start_offset=start_offset, digest=digest)
+        return transferred, digest.hexdigest(), self._built_signature(digest)
+    
+    def _delta_upload(self, local_file_path, remote_file_path, session, progress):
+        """Patch the remote copy with only the blocks that changed locally
+        
+        Returns the number of bytes sent, the SHA-256 of the local file and its
+        new block signature, or None when there is no trustworthy signature of
+        the remote copy or more than DELTA_MAX_CHANGED of the file changed, and a
+        full upload is needed; both are known before anything is copied on the
+        server. The patched file is built
+        in "<remote_path>.delta", never in the .part file full uploads resume
+        from, and is removed if patching fails.
+        """
+        try:
+            with self.session() as sftp:
+                remote_stat = sftp.stat(remote_file_path)
+        except IOError:
+            return None  # Nothing to patch
+        
+        signature = self.signatures.load(remote_file_path, remote_stat.st_size, remote_stat.st_mtime)
+        if signature is None:
+            return None
+        
+        local_size = os.path.getsize(local_file_path)
+        digest = SignatureHasher(hashlib.sha256(), DELTA_BLOCK_SIZE)
+        ops = compute_delta(local_file_path, signature, digest, max_literal_ratio=DELTA_MAX_CHANGED)
+        if ops is None:
+            return None  # Mostly changed: a full upload is cheaper than finishing the scan
+        literals = [(op[1], op[2]) for op in ops if op[0] == "data"]
+        moved = [(op[1], op[2], op[3]) for op in ops if op[0] == "copy" and op[1] != op[2]]
+        
+        # Start from a server-side copy of the old file, so unchanged blocks stay put
+        progress.start(sum(length for _, length in literals))
+        temp_path = f"{remote_file_path}.delta"
+        success, error = self.remote_copy(remote_file_path, temp_path)
+        if not success:
+            return None
+        
+        try:
+            # Shift moved blocks on the server; send them as data if that isn't possible
+            if moved and not self._remote_copy_ranges(remote_file_path, temp_path, moved):
+                literals.extend((dst, length) for src, dst, length in moved)
+                progress.start(sum(length for _, length in literals))
+            
+            count = self._byte_counter(progress)
+            with session() as sftp:
+                with open(local_file_path, "rb") as local_file, sftp.open(temp_path, "r+b") as remote_file:
+                    remote_file.set_pipelined(True)
+                    for offset, length in literals:
+                        local_file.seek(offset)
+                        remote_file.seek(offset)
+                        remaining = length
+                        while remaining > 0:
+                            data = local_file.read(min(BLOCK_SIZE, remaining))
+                            remote_file.write(data)
+                            remaining -= len(data)
+                            count(len(data))
+                    remote_file.truncate(local_size)
+                
+                remote_size = sftp.stat(temp_path).st_size
+                if remote_size != local_size:
+                    raise IOError(f"Delta upload produced {remote_size} bytes, expected {local_size}")
+                
+                finalize_remote_file(sftp, temp_path, remote_file_path)
+        except Exception:
+            # A half-patched copy is useless to any later upload
+            try:
+                with self.session() as sftp:
+                    sftp.remove(temp_path)
+            except IOError:
+                pass
+            raise
+        return sum(length for _, length in literals), digest.hexdigest(), digest.signature()
+    
+    def _channel_fan_out(self, channels):
+        """Channels one ranged transfer uses: never more than the pool lets bulk work hold at once"""
+        if not self.pool:
+            return channels
+        return max(1, min(channels, self.pool.shared_capacity()))
+    
+    def _byte_counter(self, progress):
+        """Function called with the size of every block moved: applies the bandwidth cap and counts progress"""
+        def count(size):
+            self.scheduler.throttle(size)
+            progress.add(size)
+        return count
+    
+    def _put_callback(self, progress):
+        """sftp.putfo callback that feeds _byte_counter with the bytes sent since the last call"""
+        count = self._byte_counter(progress)
+        counted = [0]
+        def callback(transferred, total):
+            count(transferred - counted[0])
+            counted[0] = transferred
+        return callback
+    
+    def _discard_partial(self, temp_path):
+        """Remove a leftover .part file, if there is one"""
+        try:
+            with self.session() as sftp:
+                sftp.remove(temp_path)
+        except IOError:
+            pass
+    
+    def _upload_digest(self, local_size):
+        """Hash object for an upload; files big enough for deltas get their signature built along the way"""
+        if local_size >= DELTA_MIN_SIZE:
+            return SignatureHasher(hashlib.sha256(), DELTA_BLOCK_SIZE)
+        return hashlib.sha256()
+    
+    @staticmethod
+    def _built_signature(digest):
+        """Signature built by an upload digest, if it builds one"""
+        return digest.signature() if isinstance(digest, SignatureHasher) else None
+    
+    def _remember_signature(self, local_file_path, remote_file_path, remote_mtime, signature=None):
+        """Store block signatures of a freshly uploaded file
+        
+        signature is the one built while the file was sent; without one (a
+        server-side copy reads nothing locally) it is computed from the file.
+        """
+        try:
+            if signature is None:
+                signature = BlockSignature.from_file(local_file_path, DELTA_BLOCK_SIZE)
+            self.signatures.save(remote_file_path, remote_mtime, signature)
+        except Exception:
+            # Without a signature the next upload is simply a full one
+            self.signatures.discard(remote_file_path)
+    
+    def _upload_resume_offset(self, local_file_path, temp_path):
+        """Find how much of a partial remote upload can be kept
+        
+        The partial file is kept only if it hashes the same as the prefix of
+        the local file. Returns the offset to resume from and the hash object of
+        that prefix, so the upload can carry on hashing from there, or (0, None).
+        """
+        try:
+            with self.session() as sftp:
+                partial_size = sftp.stat(temp_path).st_size
+        except IOError:
+            return 0, None  # Nothing to resume
+        
+        local_size = os.path.getsize(local_file_path)
+        if partial_size == 0 or partial_size > local_size:
+            return 0, None
+        
+        local_digest = prefix_digest(local_file_path, partial_size, digest=self._upload_digest(local_size))
+        
+        # Prefer hashing the whole partial file on the server
+        remote_digest, _ = self.remote_hash(temp_path)
+        if not remote_digest:
+            # No shell to hash with, so read the partial file back instead
+            remote_hasher = hashlib.sha256()
+            with self.session() as sftp, sftp.open(temp_path, "rb") as remote_file:
+                for _, data in read_blocks(remote_file, 0, partial_size, read_ahead_bytes(self.tuning)):
+                    remote_hasher.update(data)
+            remote_digest = remote_hasher.hexdigest()
+        
+        if remote_digest == local_digest.hexdigest():
+            return partial_size, local_digest
+        return 0, None
+    
+    def _download_resume_offset(self, remote_path, temp_path, remote_size):
+        """Find how much of a partial local download can be kept
+        
+        The partial file is kept only if its hash matches the hash of the same
+        prefix computed on the server; reading that prefix back instead would
+        cost as much as downloading it again, so without one it starts over.
+        """
+        if not os.path.exists(temp_path):
+            return 0
+        
+        partial_size = os.path.getsize(temp_path)
+        if partial_size == 0 or partial_size > remote_size:
+            return 0
+        
+        remote_digest, _ = self.remote_hash(remote_path, length=partial_size)
+        if remote_digest and remote_digest == prefix_digest(temp_path, partial_size).hexdigest():
+            return partial_size
+        return 0
+    
+    def _download_from_offset(self, remote_path, temp_path, offset, remote_size, progress):
+        """Download remote_path into temp_path starting at offset, retrying with backoff"""
+        count = self._byte_counter(progress)
+        with open(temp_path, "r+b" if offset else "wb") as local_file:
+            local_file.truncate(offset)
+            local_file.seek(offset)
+            
+            def fetch_remaining():
+                # Each attempt continues from whatever has been written so far
+                position = local_file.tell()
+                # Reading ahead pulls data at full speed, so only one block at a time when capped
+                read_ahead = BLOCK_SIZE if self.scheduler.is_capped() else read_ahead_bytes(self.tuning)
+                with self.session() as sftp, sftp.open(remote_path, "rb") as remote_file:
+                    for _, data in read_blocks(remote_file, position, remote_size - position, read_ahead):
+                        local_file.write(data)
+                        count(len(data))
+                local_file.flush()
+            
+            with_retries(fetch_remaining, TRANSFER_RETRIES, RETRY_BACKOFF, progress.retry)
+    
+    @measured("download", lambda call: (call["folder_name"], call["file_name"]))
+    def download_file(self, folder_name, file_name, local_directory, resume=True, chunked=None, progress=None):
+        """Download a file from a remote folder
+        
+        Data goes to "<file>.part" and is renamed into place when complete. With
+        resume=True a partial download from an earlier attempt is continued if its
+        hash matches the same prefix of the remote file.
+        
+        Files of at least CHUNKED_DOWNLOAD_THRESHOLD bytes are read as parallel
+        byte ranges over several SFTP channels (unless bandwidth is capped); pass
+        chunked=True/False to force a mode.
+        
+        Bytes received are counted on progress (a TransferProgress, created if
+        not given) and its stats are returned as "stats".
+        """
+        if not self.client:
+            success, error = self._reconnect()
+            if not success:
+                return None, error
+        
+        progress = progress or TransferProgress()
+        try:
             # Construct paths
             remote_path = os.path.join(self.remote_dir, folder_name, file_name).replace("\\", "/")
             local_path = os.path.join(local_directory, file_name)
             
+            temp_path = f"{local_path}.part"
+            
             # Download file
-            self.sftp.get(remote_path, local_path)
+            with self.session() as sftp:
+                remote_size = sftp.stat(remote_path).st_size
+            offset = self._download_resume_offset(remote_path, temp_path, remote_size) if resume else 0
+            progress.start(remote_size, done=offset)
             
-            return {"path": local_path}, None
+            if chunked is None:
+                chunked = remote_size >= CHUNKED_DOWNLOAD_THRESHOLD and not self.scheduler.is_capped()
+            if chunked:
+                progress.channels = self._channel_fan_out(DOWNLOAD_CHANNELS)
+                downloader = ChunkedDownloader(
+                    self.session, progress.channels, self.tuning.chunk_size, TRANSFER_RETRIES, RETRY_BACKOFF,
+                    throttle=self._byte_counter(progress), read_ahead=read_ahead_bytes(self.tuning),
+                    on_retry=progress.retry
+                )
+                downloader.download(remote_path, local_path, remote_size, start_offset=offset)
+            else:
+                self._download_from_offset(remote_path, temp_path, offset, remote_size, progress)
+                os.replace(temp_path, local_path)
+            progress.finish()
+            
+            return {"path": local_path, "stats": progress.stats()}, None
         except Exception as e:
             return None, str(e)
     
     def delete_file(self, folder_name, file_name):
         """Delete a file from a remote folder"""
         if not self.client:
-            success, error = self.connect()
+            success, error = self._reconnect()
             if not success:
                 return False, error
         
         try:
-            # Open SFTP if not already open
-            if not self.sftp:
-                success, error = self.open_sftp()
-                if not success:
-                    return False, error
-            
             # Construct remote file path
             remote_path = os.path.join(self.remote_dir, folder_name, file_name).replace("\\", "/")
             
             # Remove file
-            self.sftp.remove(remote_path)
+            with self.session() as sftp:
+                sftp.remove(remote_path)
+            self.signatures.discard(remote_path)
+            self.cache.invalidate_file(remote_path)
             
             return True, None
         except Exception as e:
@@ -0,0 +1,144 @@
+import itertools
+import os
+import queue
+import uuid
+from .scheduler import BULK
+from .progress import TransferProgress
+
+# Transfer item states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class TransferItem:
+    """A single file moving through the transfer queue"""
+    def __init__(self, item_id, local_path, folder_name, options=None, journal_id=None):
+        self.id = item_id
+        self.journal_id = journal_id or uuid.uuid4().hex
+        self.local_path = local_path
+        self.folder_name = folder_name
+        self.options = options or {}
+        self.file_name = os.path.basename(local_path) if local_path else None
+        self.size = os.path.getsize(local_path) if local_path and os.path.exists(local_path) else 0
+        self.progress = TransferProgress(self.size)
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+
+    def upload(self, ssh_client):
+        """Send the file; returns (result, error)"""
+        return ssh_client.upload_file(self.local_path, self.folder_name, progress=self.progress, **self.options)
+
+
+class ArchiveTransferItem(TransferItem):
+    """Many small files sent together as one archive"""
+    def __init__(self, item_id, uploads, journal_id=None):
+        folders = {folder_name for _, folder_name in uploads}
+        folder_name = folders.pop() if len(folders) == 1 else f"{len(folders)} folders"
+        super().__init__(item_id, None, folder_name, journal_id=journal_id)
+        self.uploads = uploads
+        self.file_name = f"{len(uploads)} small files (archive)"
+        self.size = sum(os.path.getsize(path) for path, _ in uploads if os.path.exists(path))
+        self.progress = TransferProgress(self.size)
+
+    def upload(self, ssh_client):
+        """Send all files as one archive; returns (results, error)"""
+        return ssh_client.upload_archive(self.uploads, progress=self.progress)
+
+
+class TransferQueue:
+    """Runs many SSHClient uploads at once in the bulk priority class
+
+    Uploads go to the bulk workers of the client's scheduler and borrow their
+    own channels from its session pool, outside the channels reserved for
+    interactive work. State changes are published on an event queue that the
+    UI drains from its own thread with poll_events(). With a TransferJournal
+    every state change is also tracked there, so unfinished items survive a
+    restart.
+    """
+    def __init__(self, ssh_client, journal=None):
+        """Initialize the queue with a shared client"""
+        self.ssh_client = ssh_client
+        self.journal = journal
+        self.items = {}
+        self._ids = itertools.count(1)
+        self._events = queue.Queue()
+        self._futures = set()
+
+    def add(self, local_path, folder_name, journal_id=None, **options):
+        """Queue a file for upload and return its TransferItem
+
+        options are passed on to SSHClient.upload_file. journal_id continues
+        an entry of the journal instead of starting a new one.
+        """
+        return self._submit(TransferItem(next(self._ids), local_path, folder_name, options, journal_id))
+
+    def add_archive(self, uploads, journal_id=None):
+        """Queue (local_path, folder_name) pairs to be sent as one archive"""
+        return self._submit(ArchiveTransferItem(next(self._ids), uploads, journal_id))
+
+    def poll_events(self):
+        """Return items whose state changed since the last poll"""
+        changed = []
+        while True:
+            try:
+                changed.append(self._events.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def active(self):
+        """Items that are queued or being uploaded"""
+        return [item for item in list(self.items.values()) if item.state in (QUEUED, RUNNING)]
+
+    def counts(self):
+        """Count items per state"""
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for item in list(self.items.values()):
+            counts[item.state] += 1
+        return counts
+
+    def is_idle(self):
+        """Check whether every queued item has finished"""
+        counts = self.counts()
+        return counts[QUEUED] == 0 and counts[RUNNING] == 0
+
+    def shutdown(self):
+        """Drop pending items; running uploads stop when the client closes"""
+        for future in list(self._futures):
+            future.cancel()
+
+    def _submit(self, item):
+        """Register an item and hand it to the bulk workers"""
+        self.items[item.id] = item
+        self._publish(item)
+        future = self.ssh_client.scheduler.submit(BULK, self._run, item)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return item
+
+    def _run(self, item):
+        """Upload a single item on a worker thread"""
+        item.state = RUNNING
+        self._publish(item)
+
+        try:
+            result, error = item.upload(self.ssh_client)
+        except Exception as e:
+            result, error = None, str(e)
+        item.progress.finish()
+
+        if error:
+            item.error = error
+            item.state = FAILED
+        else:
+            item.result = result
+            item.state = DONE
+        self._publish(item)
+
+    def _publish(self, item):
+        """Report a state change to the UI and the journal"""
+        if self.journal:
+            self.journal.track(item)
+        self._events.put(item)
@@ -0,0 +1,122 @@
+import os
+import statistics
+import time
+import uuid
+from collections import namedtuple
+
+# Window, packet, byte range and read-ahead sizes for one kind of link
+TuningProfile = namedtuple(
+    "TuningProfile",
+    ["name", "window_size", "max_packet_size", "chunk_size", "prefetch_requests", "rtt", "throughput"],
+    defaults=[None, None]
+)
+
+PROFILES = {
+    "lan": TuningProfile("lan", 4 * 1024 * 1024, 32 * 1024, 16 * 1024 * 1024, 64),
+    "wan": TuningProfile("wan", 16 * 1024 * 1024, 64 * 1024, 8 * 1024 * 1024, 256),
+    "satellite": TuningProfile("satellite", 64 * 1024 * 1024, 64 * 1024, 4 * 1024 * 1024, 1024),
+}
+
+# Round-trip times that separate the profiles, in seconds
+LAN_MAX_RTT = 0.005
+WAN_MAX_RTT = 0.2
+
+# paramiko caps every SFTP read and write request at 32 KiB
+SFTP_REQUEST_SIZE = 32 * 1024
+
+MAX_WINDOW_SIZE = 256 * 1024 * 1024
+MAX_PREFETCH_REQUESTS = 4096
+
+RTT_SAMPLES = 5
+PROBE_BYTES = 2 * 1024 * 1024
+PROBE_SECONDS = 1.0
+PROBE_BLOCK_SIZE = 256 * 1024
+
+
+def measure_link(sftp, directory, probe_bytes=PROBE_BYTES, probe_seconds=PROBE_SECONDS):
+    """Measure round-trip time and upload throughput over an open SFTP channel
+
+    The round-trip time is the median of a few stat calls; throughput comes from
+    writing a probe file of random data into directory for at most probe_bytes
+    or probe_seconds. The probe file is removed again. Returns (rtt, bytes_per_second).
+    """
+    samples = []
+    for _ in range(RTT_SAMPLES):
+        started = time.perf_counter()
+        sftp.stat(directory)
+        samples.append(time.perf_counter() - started)
+    rtt = statistics.median(samples)
+
+    # Random data, so a compressed transport can't flatter the result
+    block = os.urandom(PROBE_BLOCK_SIZE)
+    probe_path = f"{directory.rstrip('/')}/.tune-{uuid.uuid4().hex}.tmp"
+    sent = 0
+    started = time.perf_counter()
+    try:
+        with sftp.open(probe_path, "wb") as remote_file:
+            remote_file.set_pipelined(True)
+            while sent < probe_bytes and time.perf_counter() - started < probe_seconds:
+                remote_file.write(block)
+                sent += len(block)
+        # Closing waits for the server to acknowledge every write
+        elapsed = time.perf_counter() - started
+    finally:
+        try:
+            sftp.remove(probe_path)
+        except IOError:
+            pass
+
+    return rtt, sent / max(elapsed, 1e-6)
+
+
+def choose_profile(rtt, throughput):
+    """Pick the profile for a measured link and size its window to the path
+
+    The window is at least four bandwidth-delay products, so a single channel
+    can keep the path busy, and enough read-ahead requests are allowed to fill it.
+    """
+    if rtt < LAN_MAX_RTT:
+        base = PROFILES["lan"]
+    elif rtt < WAN_MAX_RTT:
+        base = PROFILES["wan"]
+    else:
+        base = PROFILES["satellite"]
+
+    window_size = min(max(base.window_size, int(4 * throughput * rtt)), MAX_WINDOW_SIZE)
+    prefetch_requests = min(max(base.prefetch_requests, window_size // SFTP_REQUEST_SIZE), MAX_PREFETCH_REQUESTS)
+    return base._replace(
+        name=f"auto/{base.name}",
+        window_size=window_size,
+        prefetch_requests=prefetch_requests,
+        rtt=rtt,
+        throughput=throughput
+    )
+
+
+def auto_tune(sftp, directory):
+    """Measure the link and pick a profile for it, falling back to WAN if the probe fails"""
+    try:
+        rtt, throughput = measure_link(sftp, directory)
+    except Exception:
+        return PROFILES["wan"]
+    return choose_profile(rtt, throughput)
+
+
+def read_ahead_bytes(profile):
+    """Bytes a download may request ahead of what it has received, None for no limit"""
+    if not profile.prefetch_requests:
+        return None
+    return profile.prefetch_requests * SFTP_REQUEST_SIZE
+
+
+def describe(profile):
+    """One-line summary of a profile for the log"""
+    text = (
+        f"{profile.name}: window {profile.window_size // 1024} KiB, "
+        f"packet {profile.max_packet_size // 1024} KiB, "
+        f"chunk {profile.chunk_size // (1024 * 1024)} MiB, "
+        f"{profile.prefetch_requests or 'unlimited'} read-ahead requests"
+    )
+    if profile.rtt is not None:
+        text += f" (RTT {profile.rtt * 1000:.1f} ms, {profile.throughput / (1024 * 1024):.1f} MiB/s)"
+    return text
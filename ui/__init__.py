@@ -1,3 +1,4 @@
 from .upload_view import UploadView
 from .browse_view import BrowseView
-from .components import StatusBar, LogPanel, SearchableCombobox, FileListView, center_window
\ No newline at end of file
+from .analytics_view import AnalyticsView
+from .components import StatusBar, LogPanel, SearchableCombobox, FileListView, TkBridge, center_window
\ No newline at end of file
@@ -0,0 +1,153 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime, timedelta
+from .components import StatusBar, FileListView, format_file_size
+
+# Operation kinds as recorded by MetricsRecorder
+OPERATIONS = {
+    "Uploads": "upload",
+    "Downloads": "download",
+    "Archive uploads": "archive",
+    "Listings": "listing"
+}
+
+GROUPINGS = {
+    "Hour": "hour",
+    "Folder": "folder",
+    "File size": "size"
+}
+
+PERIODS = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30)
+}
+
+class AnalyticsView(ttk.Frame):
+    """Throughput and latency percentiles of recorded transfers and listings"""
+    def __init__(self, parent, db_manager, metrics=None, cache=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        
+        self.db_manager = db_manager
+        self.metrics = metrics
+        self.cache = cache
+        
+        # Main container
+        self.main_container = ttk.Frame(self)
+        self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Create filter frame
+        self._create_filter_frame()
+        
+        # Create results frame
+        self._create_results_frame()
+        
+        # Hit rate of the remote metadata cache
+        self.cache_label = ttk.Label(self.main_container, text="")
+        self.cache_label.pack(fill=tk.X, pady=(10, 0))
+        
+        # Status bar
+        self.status_bar = StatusBar(self)
+        self.status_bar.pack(fill=tk.X, side=tk.BOTTOM)
+        
+        # Show current numbers whenever the tab is opened
+        self.bind("<Map>", lambda event: self.refresh())
+    
+    def _create_filter_frame(self):
+        """Create the operation, grouping and period selectors"""
+        filter_frame = ttk.LabelFrame(self.main_container, text="Show")
+        filter_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.operation_var = tk.StringVar(value="Uploads")
+        self.grouping_var = tk.StringVar(value="Hour")
+        self.period_var = tk.StringVar(value="Last 24 hours")
+        
+        selectors = [
+            ("Operation:", self.operation_var, OPERATIONS),
+            ("Group by:", self.grouping_var, GROUPINGS),
+            ("Period:", self.period_var, PERIODS)
+        ]
+        for column, (label, variable, choices) in enumerate(selectors):
+            ttk.Label(filter_frame, text=label).grid(row=0, column=column * 2, padx=5, pady=10, sticky=tk.W)
+            combobox = ttk.Combobox(
+                filter_frame,
+                textvariable=variable,
+                values=list(choices),
+                width=15,
+                state="readonly"
+            )
+            combobox.grid(row=0, column=column * 2 + 1, padx=5, pady=10, sticky=tk.W)
+            combobox.bind("<<ComboboxSelected>>", lambda event: self.refresh())
+        
+        # Refresh button
+        refresh_btn = ttk.Button(filter_frame, text="↻", width=3, command=self.refresh)
+        refresh_btn.grid(row=0, column=len(selectors) * 2, padx=5, pady=10)
+    
+    def _create_results_frame(self):
+        """Create the percentile table"""
+        results_frame = ttk.LabelFrame(self.main_container, text="Percentiles")
+        results_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = [
+            {"id": "group", "text": "Group", "width": 150},
+            {"id": "count", "text": "Count", "width": 60, "anchor": "e"},
+            {"id": "duration_p50", "text": "Time p50", "width": 80, "anchor": "e"},
+            {"id": "duration_p95", "text": "Time p95", "width": 80, "anchor": "e"},
+            {"id": "throughput_p50", "text": "Rate p50", "width": 100, "anchor": "e"},
+            {"id": "throughput_p5", "text": "Rate p5 (slowest)", "width": 120, "anchor": "e"},
+            {"id": "retries", "text": "Retries", "width": 60, "anchor": "e"}
+        ]
+        self.results = FileListView(results_frame, columns=columns)
+        self.results.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    
+    def refresh(self):
+        """Reload the percentiles for the current selection"""
+        # Metrics still buffered by the recorder would be missing otherwise
+        if self.metrics:
+            self.metrics.flush()
+        
+        if self.cache:
+            stats = self.cache.stats()
+            self.cache_label.config(
+                text=f"Metadata cache: {stats['hits']} hits, {stats['misses']} misses "
+                     f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries"
+            )
+        
+        kind = OPERATIONS[self.operation_var.get()]
+        since = datetime.now() - PERIODS[self.period_var.get()]
+        rows, error = self.db_manager.get_metric_percentiles(kind, GROUPINGS[self.grouping_var.get()], since)
+        if error:
+            self.status_bar.set_status(f"Error: {error}")
+            return
+        
+        self.results.populate([
+            (
+                row["group"],
+                row["count"],
+                self._format_seconds(row["duration_p50"]),
+                self._format_seconds(row["duration_p95"]),
+                self._format_rate(row["throughput_p50"]),
+                self._format_rate(row["throughput_p5"]),
+                row["retries"]
+            )
+            for row in rows
+        ])
+        
+        total = sum(row["count"] for row in rows)
+        self.status_bar.set_status(f"{total} {self.operation_var.get().lower()} in {len(rows)} group(s)")
+    
+    @staticmethod
+    def _format_seconds(seconds):
+        """Format a duration for the table"""
+        if seconds is None:
+            return "-"
+        if seconds < 1:
+            return f"{seconds * 1000:.0f} ms"
+        return f"{seconds:.1f} s"
+    
+    @staticmethod
+    def _format_rate(rate):
+        """Format a throughput for the table"""
+        if rate is None:
+            return "-"
+        return f"{format_file_size(int(rate))}/s"
@@ -1,18 +1,34 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
+import time
 from datetime import datetime
-from .components import StatusBar, LogPanel, SearchableCombobox, FileListView, format_file_size
+from services import AsyncSSHClient, RemoteEntry
+from services.scheduler import INTERACTIVE, NORMAL
+from services.progress import TransferProgress, combined_snapshot
+from .components import StatusBar, LogPanel, SearchableCombobox, FileListView, TkBridge, format_file_size
+from .components import format_progress, format_transfer_stats
 from utils import preview_file
 
+# How often the status bar shows download progress (milliseconds)
+PROGRESS_UPDATE_INTERVAL = 500
+
+# Pause after the last keystroke before searching (milliseconds)
+SEARCH_DELAY = 250
+
 class BrowseView(ttk.Frame):
     """File browsing and download interface"""
-    def __init__(self, parent, ssh_client, db_manager, **kwargs):
+    def __init__(self, parent, ssh_client, db_manager, async_client=None, **kwargs):
         super().__init__(parent, **kwargs)
         
         self.ssh_client = ssh_client
         self.db_manager = db_manager
+        
+        # Remote operations run in the background; results come back on the Tk thread
+        self.async_client = async_client or AsyncSSHClient(ssh_client)
+        self.bridge = TkBridge(self)
         self.current_folder = None
+        self.current_entries = {}
         self.temp_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'temp')
         
         # Ensure temp directory exists
@@ -23,6 +39,9 @@ class BrowseView(ttk.Frame):
         self.main_container = ttk.Frame(self)
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Create search frame
+        self._create_search_frame()
+        
         # Create folder selection frame
         self._create_folder_selection_frame()
         
@@ -39,6 +58,33 @@ class BrowseView(ttk.Frame):
         # Load folders
         self._load_folders()
     
+    def _create_search_frame(self):
+        """Create the search across all catalogued folders"""
+        search_frame = ttk.LabelFrame(self.main_container, text="Search All Folders")
+        search_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        # Search entry; typing searches after a short pause
+        self.search_var = tk.StringVar()
+        self.search_var.trace('w', self._schedule_search)
+        self._search_job = None
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.pack(fill=tk.X, padx=10, pady=(10, 5))
+        search_entry.bind("<Return>", lambda event: self._run_search())
+        
+        # Hits, across every folder
+        columns = [
+            {"id": "name", "text": "File Name", "width": 250},
+            {"id": "folder", "text": "Folder", "width": 150},
+            {"id": "size", "text": "Size", "width": 100},
+            {"id": "date", "text": "Date", "width": 150}
+        ]
+        self.search_results = FileListView(search_frame, columns=columns)
+        self.search_results.tree.configure(height=5)
+        self.search_results.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        # Double-click opens the hit's folder with the file selected
+        self.search_results.bind_double_click(self._open_search_hit)
+    
     def _create_folder_selection_frame(self):
         """Create folder selection section"""
         folder_frame = ttk.LabelFrame(self.main_container, text="Remote Folders")
@@ -99,7 +145,7 @@ class BrowseView(ttk.Frame):
         self.download_btn = ttk.Button(
             action_frame, 
             text="Download Selected",
-            command=self._download_selected_file,
+            command=self._download_selected_files,
             state=tk.DISABLED
         )
         self.download_btn.pack(side=tk.RIGHT, padx=5)
@@ -141,28 +187,27 @@ class BrowseView(ttk.Frame):
     def refresh_folder_list(self):
         """Refresh folder list from remote server"""
         self.status_bar.set_status("Refreshing folder list...")
-        
+        self.bridge.watch(self.async_client.list_folders(use_cache=False), self._on_folders_refreshed)
+    
+    def _on_folders_refreshed(self, folders, error):
+        """Store a refreshed folder list"""
         try:
-            folders, error = self.ssh_client.list_folders()
-            
             if error:
                 self.status_bar.set_status(f"Error: {error}")
                 messagebox.showerror("Refresh Error", f"Error refreshing folder list: {error}")
                 return
             
-            # Clear existing folders
-            success, error = self.db_manager.clear_folders()
-            if not success:
+            # Apply only what changed on the server, in one transaction
+            _, error = self.db_manager.sync_folders([
+                (folder_name, os.path.join(self.ssh_client.remote_dir, folder_name).replace("\\", "/"))
+                for folder_name in folders
+                if folder_name  # Skip empty lines
+            ])
+            if error:
                 self.status_bar.set_status(f"Error: {error}")
-                messagebox.showerror("Database Error", f"Error clearing folder database: {error}")
+                messagebox.showerror("Database Error", f"Error updating folder database: {error}")
                 return
             
-            # Add each folder to database
-            for folder_name in folders:
-                if folder_name:  # Skip empty lines
-                    full_path = os.path.join(self.ssh_client.remote_dir, folder_name).replace("\\", "/")
-                    self.db_manager.add_folder(folder_name, full_path)
-            
             # Reload folders in UI
             self._load_folders()
             
@@ -185,6 +230,62 @@ class BrowseView(ttk.Frame):
         self._load_files_in_folder(selected_folder)
         self._enable_refresh_button()
     
+    def _schedule_search(self, *args):
+        """Search once typing pauses"""
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(SEARCH_DELAY, self._run_search)
+    
+    def _run_search(self):
+        """Search the catalog for the text in the search box"""
+        self._search_job = None
+        query = self.search_var.get().strip()
+        if not query:
+            self.search_results.populate([])
+            return
+        
+        # Searching reads the local catalog only, on a worker's own database connection
+        self.bridge.watch(
+            self.async_client.run(INTERACTIVE, self.db_manager.search_files, query),
+            lambda hits, error: self._on_search_done(query, hits, error)
+        )
+    
+    def _on_search_done(self, query, hits, error):
+        """Show search hits unless the query changed meanwhile"""
+        if query != self.search_var.get().strip():
+            return
+        
+        if error:
+            self.status_bar.set_status(f"Error: {error}")
+            return
+        
+        self.search_results.populate([
+            (file_name, folder_name, format_file_size(size or 0),
+             datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M") if mtime else "")
+            for folder_name, file_name, size, mtime in hits
+        ])
+        self.status_bar.set_status(f"{len(hits)} file(s) matching '{query}'")
+    
+    def _open_search_hit(self, event=None):
+        """Open the folder of the selected search hit and select the file"""
+        hit = self.search_results.get_selected_item()
+        if not hit:
+            return
+        
+        # Treeview hands back numeric-looking values as numbers
+        file_name, folder_name = str(hit[0]), str(hit[1])
+        self.folder_selector.set(folder_name)
+        self.current_folder = folder_name
+        self._load_files_in_folder(folder_name)
+        self._enable_refresh_button()
+        
+        # The catalog was rendered synchronously, so the row is there already
+        for row_id in self.file_list.tree.get_children():
+            if str(self.file_list.tree.item(row_id, "values")[0]) == file_name:
+                self.file_list.tree.selection_set(row_id)
+                self.file_list.tree.see(row_id)
+                break
+    
     def _on_file_selected(self, event=None):
         """Handle file selection in the list"""
         selected_item = self.file_list.get_selected_item()
@@ -193,56 +294,85 @@ class BrowseView(ttk.Frame):
         else:
             self._disable_file_buttons()
     
-    def _load_files_in_folder(self, folder_name):
-        """Load files from selected folder"""
-        self.status_bar.set_status(f"Loading files in folder '{folder_name}'...")
+    def _load_files_in_folder(self, folder_name, use_cache=True):
+        """Show a folder from the local catalog at once, then reconcile it with the server"""
+        catalog, _ = self.db_manager.get_catalog(folder_name)
+        if catalog is not None:
+            self._show_entries([RemoteEntry(*row) for row in catalog])
+            self.status_bar.set_status(f"Loaded {len(catalog)} files from '{folder_name}', checking the server...")
+        else:
+            self.status_bar.set_status(f"Loading files in folder '{folder_name}'...")
+        
+        # Get files with their attributes from the remote server in one pass
+        listed_at = datetime.now()
+        self.bridge.watch(
+            self.async_client.list_directory(folder_name, use_cache=use_cache),
+            lambda entries, error: self._on_files_loaded(folder_name, entries, error, listed_at)
+        )
+    
+    def _on_files_loaded(self, folder_name, entries, error, listed_at):
+        """Show a folder listing if it differs from the catalog and store it"""
+        if folder_name != self.current_folder:
+            return  # Another folder was selected while this one was loading
         
         try:
-            # Get files from remote server
-            files, error = self.ssh_client.list_files(folder_name)
-            
             if error:
                 self.status_bar.set_status(f"Error: {error}")
                 messagebox.showerror("Error", f"Error listing files: {error}")
                 return
             
-            # Prepare list items
-            list_items = []
-            for file_name in files:
-                if not file_name:  # Skip empty names
-                    continue
-                
-                # Get file info from database or server
-                file_record, _ = self.db_manager.get_file_by_name(folder_name, file_name)
-                
-                if file_record:
-                    # Use database info
-                    file_id, local_path, remote_path, size = file_record
-                    # Format for display
-                    size_formatted = format_file_size(size)
-                    date = datetime.now().strftime("%Y-%m-%d %H:%M")  # Use placeholder date for now
-                else:
-                    # Get info from server
-                    file_info, err = self.ssh_client.get_file_info(folder_name, file_name)
-                    if file_info:
-                        size = file_info.get("size", 0)
-                        size_formatted = format_file_size(size)
-                        date = datetime.fromtimestamp(file_info.get("mtime", 0)).strftime("%Y-%m-%d %H:%M")
-                    else:
-                        size_formatted = "Unknown"
-                        date = "Unknown"
-                
-                # Add to display list
-                list_items.append((file_name, size_formatted, date))
+            files = [entry for entry in entries if entry.type == "file"]
+            if files != list(self.current_entries.values()):
+                self._show_entries(files)
             
-            # Populate the list view
-            self.file_list.populate(list_items)
+            # Write the catalog off the Tk thread, but not behind the queued uploads in the bulk class
+            self.async_client.run(NORMAL, self.db_manager.catalog_folder, folder_name, list(entries), listed_at)
             
-            self.status_bar.set_status(f"Loaded {len(list_items)} files from '{folder_name}'")
+            self.status_bar.set_status(f"Loaded {len(files)} files from '{folder_name}'")
         except Exception as e:
             self.status_bar.set_status(f"Error: {str(e)}")
             messagebox.showerror("Error", f"Error loading files: {str(e)}")
     
+    def _show_entries(self, entries):
+        """Fill the file list with RemoteEntry items"""
+        self.current_entries = {entry.name: entry for entry in entries}
+        
+        # Prepare list items
+        list_items = []
+        for entry in entries:
+            size_formatted = format_file_size(entry.size or 0)
+            # Files recorded by an upload have no remote mtime until the next listing
+            date = datetime.fromtimestamp(entry.mtime).strftime("%Y-%m-%d %H:%M") if entry.mtime else ""
+            
+            # Add to display list
+            list_items.append((entry.name, size_formatted, date))
+        
+        # Populate the list view
+        self.file_list.populate(list_items)
+        self._disable_file_buttons()
+    
+    def _record_downloads(self, folder_name, downloads):
+        """Add (file_name, local_path) downloads to the database unless a local copy is already known"""
+        known, _ = self.db_manager.get_files_by_names(folder_name, [file_name for file_name, _ in downloads])
+        
+        files = []
+        for file_name, local_path in downloads:
+            file_record = known.get(file_name)
+            if file_record and file_record[1]:
+                continue
+            
+            remote_path = os.path.join(
+                self.ssh_client.remote_dir, 
+                folder_name, 
+                file_name
+            ).replace("\\", "/")
+            
+            # The local copy is complete, so its size is the remote size
+            files.append((file_name, folder_name, local_path, remote_path, os.path.getsize(local_path), None, None))
+        
+        if files:
+            self.db_manager.add_files(files)
+    
     def _on_file_double_click(self, event):
         """Handle double-click on file"""
         self._preview_selected_file()
@@ -259,14 +389,14 @@ class BrowseView(ttk.Frame):
             return
         
         file_name = selected_item[0]
+        folder_name = self.current_folder
         
         self.status_bar.set_status(f"Preparing preview for {file_name}...")
         
         try:
             # Check if file exists in database
-            file_record, _ = self.db_manager.get_file_by_name(self.current_folder, file_name)
+            file_record, _ = self.db_manager.get_file_by_name(folder_name, file_name)
             
-            local_path = None
             if file_record:
                 # File exists in database, check if local path exists
                 _, local_path, _, _ = file_record
@@ -275,42 +405,30 @@ class BrowseView(ttk.Frame):
                     self.status_bar.set_status(f"Previewing {file_name}")
                     preview_file(self, local_path)
                     return
-            
-            # File doesn't exist locally or local copy not found, download to temp directory
-            temp_file_path = os.path.join(self.temp_dir, file_name)
-            
-            # Download the file
-            result, error = self.ssh_client.download_file(
-                self.current_folder, 
-                file_name, 
-                self.temp_dir
-            )
-            
+        except Exception as e:
+            self.status_bar.set_status(f"Error: {str(e)}")
+            messagebox.showerror("Preview Error", f"Error: {str(e)}")
+            return
+        
+        # File doesn't exist locally or local copy not found, download to temp directory
+        # The user is waiting on the preview, so it goes ahead of other transfers
+        self.bridge.watch(
+            self.async_client.download_file(folder_name, file_name, self.temp_dir, priority_class=INTERACTIVE),
+            lambda result, error: self._on_preview_downloaded(folder_name, file_name, result, error)
+        )
+    
+    def _on_preview_downloaded(self, folder_name, file_name, result, error):
+        """Show a file downloaded for preview"""
+        try:
             if error:
                 self.status_bar.set_status(f"Error: {error}")
                 messagebox.showerror("Preview Error", f"Error downloading file for preview: {error}")
                 return
             
-            # Update database with local path if needed
-            if not file_record:
-                # Get file info from server
-                file_info, _ = self.ssh_client.get_file_info(self.current_folder, file_name)
-                if file_info:
-                    size = file_info.get("size", 0)
-                    remote_path = os.path.join(
-                        self.ssh_client.remote_dir, 
-                        self.current_folder, 
-                        file_name
-                    ).replace("\\", "/")
-                    
-                    # Add to database with temp path
-                    self.db_manager.add_file(
-                        file_name,
-                        self.current_folder,
-                        temp_file_path,
-                        remote_path,
-                        size
-                    )
+            temp_file_path = result["path"]
+            
+            # Update database with the temp path if needed
+            self._record_downloads(folder_name, [(file_name, temp_file_path)])
             
             # Show preview
             self.status_bar.set_status(f"Previewing {file_name}")
@@ -320,67 +438,96 @@ class BrowseView(ttk.Frame):
             self.status_bar.set_status(f"Error: {str(e)}")
             messagebox.showerror("Preview Error", f"Error: {str(e)}")
     
-    def _download_selected_file(self):
-        """Download the selected file"""
+    def _download_selected_files(self):
+        """Download every selected file, several at a time"""
         if not self.current_folder:
             messagebox.showerror("Error", "No folder selected")
             return
         
-        selected_item = self.file_list.get_selected_item()
-        if not selected_item:
+        selected_items = self.file_list.get_selected_items()
+        if not selected_items:
             messagebox.showerror("Error", "No file selected")
             return
         
-        file_name = selected_item[0]
+        file_names = [item[0] for item in selected_items]
+        folder_name = self.current_folder
         
         # Ask for download location
         download_dir = filedialog.askdirectory(title="Select Download Location")
         if not download_dir:
             return  # User canceled
         
-        self.status_bar.set_status(f"Downloading {file_name}...")
+        # The scheduler runs up to ASYNC_WORKERS downloads at once
+        batch = {
+            "total": len(file_names), "finished": 0, "paths": [], "downloaded": [], "errors": [],
+            "progress": [], "started": time.monotonic()
+        }
+        self.status_bar.set_status(f"Downloading {len(file_names)} file(s)...")
+        for file_name in file_names:
+            entry = self.current_entries.get(file_name)
+            progress = TransferProgress(entry.size if entry else 0)
+            batch["progress"].append(progress)
+            self.bridge.watch(
+                self.async_client.download_file(folder_name, file_name, download_dir, progress=progress),
+                lambda result, error, file_name=file_name: self._on_file_downloaded(
+                    batch, folder_name, file_name, result, error
+                )
+            )
+        
+        self.after(PROGRESS_UPDATE_INTERVAL, lambda: self._poll_downloads(batch))
+    
+    def _poll_downloads(self, batch):
+        """Show the combined rate and ETA of a download batch until it is done"""
+        if batch["finished"] >= batch["total"]:
+            return
+        
+        progress = combined_snapshot(batch["progress"])
+        self.status_bar.set_status(
+            f"Downloading: {batch['finished']} of {batch['total']} finished - {format_progress(progress)}"
+        )
+        self.after(PROGRESS_UPDATE_INTERVAL, lambda: self._poll_downloads(batch))
+    
+    def _on_file_downloaded(self, batch, folder_name, file_name, result, error):
+        """Record a finished download and report once the whole selection is done"""
+        batch["finished"] += 1
         
         try:
-            result, error = self.ssh_client.download_file(
-                self.current_folder, 
-                file_name, 
-                download_dir
-            )
-            
             if error:
-                self.status_bar.set_status(f"Error: {error}")
-                messagebox.showerror("Download Error", f"Error downloading file: {error}")
-                return
-            
-            local_path = result["path"]
-            
-            # Update database with local path if needed
-            file_record, _ = self.db_manager.get_file_by_name(self.current_folder, file_name)
-            if not file_record:
-                # Get file info from server
-                file_info, _ = self.ssh_client.get_file_info(self.current_folder, file_name)
-                if file_info:
-                    size = file_info.get("size", 0)
-                    remote_path = os.path.join(
-                        self.ssh_client.remote_dir, 
-                        self.current_folder, 
-                        file_name
-                    ).replace("\\", "/")
-                    
-                    # Add to database
-                    self.db_manager.add_file(
-                        file_name,
-                        self.current_folder,
-                        local_path,
-                        remote_path,
-                        size
-                    )
-            
-            self.status_bar.set_status(f"File downloaded to {local_path}")
-            messagebox.showinfo("Download Complete", f"File downloaded to:\n{local_path}")
+                batch["errors"].append(f"{file_name}: {error}")
+            else:
+                batch["downloaded"].append((file_name, result["path"]))
+                batch["paths"].append(result["path"])
+                batch["stats"] = result["stats"]
         except Exception as e:
-            self.status_bar.set_status(f"Error: {str(e)}")
-            messagebox.showerror("Download Error", f"Error: {str(e)}")
+            batch["errors"].append(f"{file_name}: {str(e)}")
+        
+        if batch["finished"] < batch["total"]:
+            return  # _poll_downloads reports progress
+        
+        # Update database with the local paths of the whole selection at once
+        try:
+            self._record_downloads(folder_name, batch["downloaded"])
+        except Exception as e:
+            batch["errors"].append(f"Database update failed: {str(e)}")
+        
+        if batch["errors"]:
+            self.status_bar.set_status(f"Error: {len(batch['errors'])} download(s) failed")
+            messagebox.showerror("Download Error", "Error downloading file(s):\n" + "\n".join(batch["errors"]))
+        elif batch["total"] == 1:
+            local_path = batch["paths"][0]
+            self.status_bar.set_status(f"File downloaded to {local_path} ({format_transfer_stats(batch['stats'])})")
+            messagebox.showinfo("Download Complete", f"File downloaded to:\n{local_path}")
+        else:
+            download_dir = os.path.dirname(batch["paths"][0])
+            # Parallel downloads overlap, so the batch rate is over its wall-clock time
+            transferred = sum(progress.stats()["bytes"] for progress in batch["progress"])
+            elapsed = max(time.monotonic() - batch["started"], 1e-6)
+            self.status_bar.set_status(
+                f"{batch['total']} files downloaded to {download_dir} "
+                f"({format_file_size(transferred)} in {elapsed:.1f} s, "
+                f"{format_file_size(int(transferred / elapsed))}/s)"
+            )
+            messagebox.showinfo("Download Complete", f"{batch['total']} files downloaded to:\n{download_dir}")
     
     def _delete_selected_file(self):
         """Delete the selected file"""
@@ -394,6 +541,7 @@ class BrowseView(ttk.Frame):
             return
         
         file_name = selected_item[0]
+        folder_name = self.current_folder
         
         # Confirm deletion
         confirm = messagebox.askyesno(
@@ -404,23 +552,28 @@ class BrowseView(ttk.Frame):
             return
         
         self.status_bar.set_status(f"Deleting {file_name}...")
-        
+        self.bridge.watch(
+            self.async_client.delete_file(folder_name, file_name),
+            lambda success, error: self._on_file_deleted(folder_name, file_name, success, error)
+        )
+    
+    def _on_file_deleted(self, folder_name, file_name, success, error):
+        """Forget a file deleted from the remote server"""
         try:
-            success, error = self.ssh_client.delete_file(self.current_folder, file_name)
-            
             if not success:
                 self.status_bar.set_status(f"Error: {error}")
                 messagebox.showerror("Delete Error", f"Error deleting file: {error}")
                 return
             
             # Remove from database if exists
-            file_record, _ = self.db_manager.get_file_by_name(self.current_folder, file_name)
+            file_record, _ = self.db_manager.get_file_by_name(folder_name, file_name)
             if file_record:
                 file_id = file_record[0]
                 self.db_manager.delete_file(file_id)
             
             # Refresh file list
-            self._load_files_in_folder(self.current_folder)
+            if folder_name == self.current_folder:
+                self._load_files_in_folder(folder_name)
             
             self.status_bar.set_status(f"File '{file_name}' deleted successfully")
             messagebox.showinfo("Delete Complete", f"File '{file_name}' deleted successfully")
@@ -433,7 +586,7 @@ class BrowseView(ttk.Frame):
         if not self.current_folder:
             return
         
-        self._load_files_in_folder(self.current_folder)
+        self._load_files_in_folder(self.current_folder, use_cache=False)
     
     def _enable_file_buttons(self):
         """Enable file action buttons"""
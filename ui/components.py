@@ -2,8 +2,12 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter.scrolledtext import ScrolledText
 import os
+import queue
 from datetime import datetime
 
+# How often completed background operations are handed to their callbacks (milliseconds)
+BRIDGE_POLL_INTERVAL = 50
+
 class StatusBar(ttk.Frame):
     """Status bar with message display"""
     def __init__(self, parent, **kwargs):
@@ -173,6 +177,15 @@ class FileListView(ttk.Frame):
         for item in items:
             self.tree.insert("", tk.END, values=item)
     
+    def add_item(self, values, item_id=None):
+        """Append a single row, optionally with a stable row id"""
+        return self.tree.insert("", tk.END, iid=item_id, values=values)
+    
+    def update_item(self, item_id, values):
+        """Replace the values of an existing row"""
+        if self.tree.exists(item_id):
+            self.tree.item(item_id, values=values)
+    
     def get_selected_item(self):
         """Get the selected item"""
         selected_items = self.tree.selection()
@@ -183,11 +196,54 @@ class FileListView(ttk.Frame):
         values = self.tree.item(item_id, "values")
         return values
     
+    def get_selected_items(self):
+        """Get the values of every selected row"""
+        return [self.tree.item(item_id, "values") for item_id in self.tree.selection()]
+    
     def bind_double_click(self, callback):
         """Bind double-click event to a callback"""
         self.tree.bind("<Double-1>", callback)
 
 
+class TkBridge:
+    """Hands results of background futures to callbacks on the Tk thread
+
+    Worker threads only put finished futures on a queue; the widget's after()
+    loop drains it and calls callback(*result), so callbacks may touch widgets
+    and the database freely.
+    """
+    def __init__(self, widget, interval=BRIDGE_POLL_INTERVAL):
+        """Start polling for completed futures"""
+        self.widget = widget
+        self.interval = interval
+        self._completed = queue.Queue()
+        self.widget.after(self.interval, self._poll)
+    
+    def watch(self, future, callback):
+        """Call callback with the future's (result, error) tuple once it finishes"""
+        future.add_done_callback(lambda done: self._completed.put((callback, done)))
+        return future
+    
+    def _poll(self):
+        """Run the callbacks of every future that finished since the last poll"""
+        try:
+            while True:
+                try:
+                    callback, future = self._completed.get_nowait()
+                except queue.Empty:
+                    break
+                
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = (None, str(e))
+                callback(*result)
+        finally:
+            self.widget.after(self.interval, self._poll)
+
+
 def format_file_size(size_bytes):
     """Format file size in human-readable format"""
     if size_bytes < 1024:
@@ -200,6 +256,34 @@ def format_file_size(size_bytes):
         return f"{size_bytes/(1024*1024*1024):.1f} GB"
 
 
+def format_duration(seconds):
+    """Format a number of seconds as m:ss or h:mm:ss"""
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_progress(snapshot):
+    """Format a progress snapshot as percentage, rate and time left"""
+    text = f"{snapshot['fraction'] * 100:.0f}%"
+    if snapshot["rate"] > 0:
+        text += f" · {format_file_size(int(snapshot['rate']))}/s"
+    if snapshot["eta"] is not None:
+        text += f" · {format_duration(snapshot['eta'])} left"
+    return text
+
+
+def format_transfer_stats(stats):
+    """Format per-transfer stats: bytes, duration, average and peak rate"""
+    return (
+        f"{format_file_size(stats['bytes'])} in {stats['duration']:.1f} s, "
+        f"avg {format_file_size(int(stats['avg_rate']))}/s, peak {format_file_size(int(stats['peak_rate']))}/s"
+    )
+
+
 def center_window(window, width, height):
     """Center a window on the screen"""
     screen_width = window.winfo_screenwidth()
@@ -2,20 +2,45 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import re
-from .components import StatusBar, LogPanel, SearchableCombobox
+import time
+from config import ARCHIVE_FILE_MAX_SIZE, ARCHIVE_MIN_FILES, ARCHIVE_MAX_FILES, ARCHIVE_MAX_BYTES
+from services import TransferQueue, AsyncSSHClient, ArchiveTransferItem, TransferJournal
+from services.scheduler import NORMAL
+from services.transfer_queue import QUEUED, RUNNING, DONE, FAILED
+from services.progress import combined_snapshot
+from utils import scan_tree
+from .components import StatusBar, LogPanel, SearchableCombobox, FileListView, TkBridge, format_file_size
+from .components import format_progress, format_transfer_stats
+
+# How often the transfer queue is polled for state changes (milliseconds)
+QUEUE_POLL_INTERVAL = 100
+
+# Shortest time between progress redraws, so fast transfers don't flood Tk (seconds)
+PROGRESS_UPDATE_INTERVAL = 0.5
 
 class UploadView(ttk.Frame):
     """File upload interface"""
-    def __init__(self, parent, ssh_client, db_manager, on_refresh_callback=None, **kwargs):
+    def __init__(self, parent, ssh_client, db_manager, on_refresh_callback=None, async_client=None, **kwargs):
         super().__init__(parent, **kwargs)
         
         self.ssh_client = ssh_client
         self.db_manager = db_manager
         self.on_refresh_callback = on_refresh_callback
         
+        # Remote operations run in the background; results come back on the Tk thread
+        self.async_client = async_client or AsyncSSHClient(ssh_client)
+        self.bridge = TkBridge(self)
+        
+        # Background uploads, journaled so an interrupted batch can resume
+        self.journal = TransferJournal(db_manager)
+        self.transfer_queue = TransferQueue(ssh_client, journal=self.journal)
+        self._queue_active = False
+        self._last_progress_update = 0.0
+        
         # Create frames
         self._create_folder_frame()
         self._create_upload_frame()
+        self._create_queue_frame()
         
         # Log panel
         self.log_panel = LogPanel(self)
@@ -27,6 +52,9 @@ class UploadView(ttk.Frame):
         
         # Load folders
         self._load_folders()
+        
+        # Start watching the transfer queue
+        self.after(QUEUE_POLL_INTERVAL, self._poll_transfer_queue)
     
     def _create_folder_frame(self):
         """Create the folder creation frame"""
@@ -71,9 +99,30 @@ class UploadView(ttk.Frame):
         refresh_btn = ttk.Button(upload_entry_frame, text="↻", width=3, command=self._refresh_folder_list)
         refresh_btn.grid(row=0, column=2, padx=5, pady=5)
         
-        # Upload button
-        browse_btn = ttk.Button(upload_frame, text="Select File to Upload", command=self._browse_file)
-        browse_btn.pack(pady=10)
+        # Upload buttons
+        button_frame = ttk.Frame(upload_frame)
+        button_frame.pack(pady=10)
+        
+        browse_btn = ttk.Button(button_frame, text="Select Files to Upload", command=self._browse_files)
+        browse_btn.pack(side=tk.LEFT, padx=5)
+        
+        browse_folder_btn = ttk.Button(button_frame, text="Select Folder to Upload", command=self._browse_folder)
+        browse_folder_btn.pack(side=tk.LEFT, padx=5)
+    
+    def _create_queue_frame(self):
+        """Create the transfer queue list"""
+        queue_frame = ttk.LabelFrame(self, text="Transfer Queue")
+        queue_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        columns = [
+            {"id": "name", "text": "File Name", "width": 250},
+            {"id": "folder", "text": "Folder", "width": 150},
+            {"id": "size", "text": "Size", "width": 100},
+            {"id": "state", "text": "Status", "width": 220}
+        ]
+        self.queue_list = FileListView(queue_frame, columns=columns)
+        self.queue_list.tree.configure(height=5)
+        self.queue_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
     
     def _load_folders(self):
         """Load folders from database into the combobox"""
@@ -93,26 +142,25 @@ class UploadView(ttk.Frame):
     def _refresh_folder_list(self):
         """Refresh folder list from remote server"""
         self.status_bar.set_status("Refreshing folder list...")
-        
+        self.bridge.watch(self.async_client.list_folders(use_cache=False), self._on_folders_refreshed)
+    
+    def _on_folders_refreshed(self, folders, error):
+        """Store a refreshed folder list"""
         try:
-            folders, error = self.ssh_client.list_folders()
-            
             if error:
                 self.log_panel.log_message(f"Error refreshing folder list: {error}", "ERROR")
                 self.status_bar.set_status("Failed to refresh folder list")
                 messagebox.showerror("Refresh Error", f"Error refreshing folder list: {error}")
                 return
             
-            # Clear existing folders
-            success, error = self.db_manager.clear_folders()
-            if not success:
-                self.log_panel.log_message(f"Error clearing folder database: {error}", "ERROR")
-            
-            # Add each folder to database
-            for folder_name in folders:
-                if folder_name:  # Skip empty lines
-                    full_path = os.path.join(self.ssh_client.remote_dir, folder_name).replace("\\", "/")
-                    self.db_manager.add_folder(folder_name, full_path)
+            # Apply only what changed on the server, in one transaction
+            changes, error = self.db_manager.sync_folders([
+                (folder_name, os.path.join(self.ssh_client.remote_dir, folder_name).replace("\\", "/"))
+                for folder_name in folders
+                if folder_name  # Skip empty lines
+            ])
+            if error:
+                self.log_panel.log_message(f"Error updating folder database: {error}", "ERROR")
             
             # Reload folders in UI
             self._load_folders()
@@ -122,7 +170,10 @@ class UploadView(ttk.Frame):
                 self.on_refresh_callback()
             
             self.status_bar.set_status("Folder list refreshed successfully")
-            self.log_panel.log_message("Folder list refreshed successfully")
+            if changes:
+                self.log_panel.log_message(
+                    f"Folder list refreshed successfully ({changes['added']} added, {changes['removed']} removed)"
+                )
         except Exception as e:
             self.log_panel.log_message(f"Error refreshing folder list: {str(e)}", "ERROR")
             self.status_bar.set_status("Failed to refresh folder list")
@@ -136,16 +187,23 @@ class UploadView(ttk.Frame):
             messagebox.showerror("Error", "Please enter a folder name")
             return
         
-        # Validate folder name (no special characters except underscore and hyphen)
-        if not re.match(r'^[a-zA-Z0-9_-]+$', folder_name):
-            messagebox.showerror("Error", "Folder name can only contain letters, numbers, underscore and hyphen")
+        # Validate folder name (no special characters except underscore and hyphen, "/" between levels)
+        if not re.match(r'^[a-zA-Z0-9_-]+(/[a-zA-Z0-9_-]+)*$', folder_name):
+            messagebox.showerror(
+                "Error",
+                "Folder name can only contain letters, numbers, underscore and hyphen, with / between nested folders"
+            )
             return
         
         self.status_bar.set_status(f"Creating folder '{folder_name}'...")
-        
+        self.bridge.watch(
+            self.async_client.create_folder(folder_name),
+            lambda success, result: self._on_folder_created(folder_name, success, result)
+        )
+    
+    def _on_folder_created(self, folder_name, success, result):
+        """Record a folder created on the remote server"""
         try:
-            success, result = self.ssh_client.create_folder(folder_name)
-            
             if not success:
                 self.log_panel.log_message(f"Failed to create folder: {result}", "ERROR")
                 self.status_bar.set_status("Failed to create folder")
@@ -182,16 +240,16 @@ class UploadView(ttk.Frame):
             self.status_bar.set_status("Failed to create folder")
             messagebox.showerror("Error", f"Error creating folder: {str(e)}")
     
-    def _browse_file(self):
-        """Browse for file and upload it"""
+    def _browse_files(self):
+        """Browse for one or more files and queue them for upload"""
         target_folder = self.folder_selector.get()
         
         if not target_folder:
             messagebox.showerror("Error", "Please select a target folder")
             return
         
-        file_path = filedialog.askopenfilename(
-            title="Select a file to upload",
+        file_paths = filedialog.askopenfilenames(
+            title="Select files to upload",
             filetypes=[
                 ("All Files", "*.*"),
                 ("Text Files", "*.txt"),
@@ -201,51 +259,335 @@ class UploadView(ttk.Frame):
             ]
         )
         
-        if not file_path:
+        if not file_paths:
             return  # User canceled the file selection
         
-        self._upload_file(file_path, target_folder)
+        self._queue_uploads([(file_path, target_folder) for file_path in file_paths])
     
-    def _upload_file(self, local_file_path, target_folder):
-        """Upload the file to the specified remote folder"""
-        self.status_bar.set_status(f"Uploading file to {target_folder}...")
-        self.log_panel.log_message(f"Selected file: {local_file_path}")
+    def _browse_folder(self):
+        """Browse for a local folder and queue its whole tree for upload"""
+        target_folder = self.folder_selector.get()
         
-        try:
-            result, error = self.ssh_client.upload_file(local_file_path, target_folder)
-            
-            if error:
-                self.log_panel.log_message(f"Error during upload: {error}", "ERROR")
-                self.status_bar.set_status("Upload failed")
-                messagebox.showerror("Upload Error", f"Error: {error}")
-                return
-            
-            remote_file_path = result["path"]
-            file_size = result["size"]
-            file_name = os.path.basename(local_file_path)
-            
-            # Add file to database
-            success, error = self.db_manager.add_file(
-                file_name, 
-                target_folder, 
-                local_file_path, 
-                remote_file_path,
-                file_size
-            )
-            
+        if not target_folder:
+            messagebox.showerror("Error", "Please select a target folder")
+            return
+        
+        local_dir = filedialog.askdirectory(title="Select a folder to upload")
+        if not local_dir:
+            return  # User canceled the folder selection
+        
+        # Scanning and creating the remote folders can take a while for big trees
+        self.status_bar.set_status(f"Scanning {local_dir}...")
+        self.bridge.watch(
+            self.async_client.run(NORMAL, self._prepare_tree_upload, local_dir, target_folder),
+            lambda result, error: self._on_tree_prepared(local_dir, target_folder, result, error)
+        )
+    
+    def _prepare_tree_upload(self, local_dir, target_folder):
+        """Scan a local tree and create its folders on the server (runs on a worker thread)"""
+        directories, files = scan_tree(local_dir)
+        folders = [target_folder] + [f"{target_folder}/{directory}" for directory in directories]
+        
+        commands, error = self.ssh_client.create_folders(folders)
+        if error:
+            return None, error
+        
+        uploads = [
+            (file_path, f"{target_folder}/{relative_dir}" if relative_dir else target_folder)
+            for file_path, relative_dir in files
+        ]
+        return {"folders": folders, "uploads": uploads, "commands": commands}, None
+    
+    def _on_tree_prepared(self, local_dir, target_folder, result, error):
+        """Queue the files of a scanned tree once its remote folders exist"""
+        if error:
+            self.log_panel.log_message(f"Error preparing upload of {local_dir}: {error}", "ERROR")
+            self.status_bar.set_status("Failed to prepare folder upload")
+            messagebox.showerror("Upload Error", f"Error preparing folder upload: {error}")
+            return
+        
+        if not result["uploads"]:
+            self.status_bar.set_status("Ready")
+            messagebox.showinfo("Upload", "The selected folder contains no files")
+            return
+        
+        # Register the nested folders so their files can be recorded and browsed
+        nested = [
+            (folder_name, os.path.join(self.ssh_client.remote_dir, folder_name).replace("\\", "/"))
+            for folder_name in result["folders"][1:]
+        ]
+        if nested:
+            success, error = self.db_manager.add_folders(nested)
             if not success:
                 self.log_panel.log_message(f"Database error: {error}", "ERROR")
-                messagebox.showwarning("Warning", f"File uploaded but database update failed: {error}")
+            self._load_folders()
+            self.folder_selector.set(target_folder)
+        
+        self.log_panel.log_message(
+            f"Created {len(result['folders'])} folder(s) under {target_folder} "
+            f"with {result['commands']} remote command(s)"
+        )
+        self._queue_uploads(result["uploads"])
+        
+        # Call refresh callback if provided
+        if nested and self.on_refresh_callback:
+            self.on_refresh_callback()
+    
+    def _queue_uploads(self, uploads):
+        """Add (file_path, target_folder) pairs to the transfer queue
+        
+        Small files that can't be copied on the server are batched into
+        archives when there are enough of them; the rest go one by one.
+        """
+        dedup = self._dedup_options([file_path for file_path, _ in uploads])
+        
+        small = []
+        single = []
+        for file_path, target_folder in uploads:
+            options = dedup.get(file_path, {})
+            if not options and 0 <= self._file_size(file_path) <= ARCHIVE_FILE_MAX_SIZE:
+                small.append((file_path, target_folder))
+            else:
+                single.append((file_path, target_folder, options))
+        
+        if len(small) < ARCHIVE_MIN_FILES:
+            single.extend((file_path, target_folder, {}) for file_path, target_folder in small)
+            small = []
+        
+        for batch in self._archive_batches(small):
+            item = self.transfer_queue.add_archive(batch)
+            self.queue_list.add_item(self._queue_row(item), item_id=str(item.id))
+        
+        for file_path, target_folder, options in single:
+            item = self.transfer_queue.add(file_path, target_folder, **options)
+            self.queue_list.add_item(self._queue_row(item), item_id=str(item.id))
+        
+        self._queue_active = True
+        target_folders = {target_folder for _, target_folder in uploads}
+        if len(target_folders) == 1:
+            self.log_panel.log_message(f"Queued {len(uploads)} file(s) for upload to {target_folders.pop()}")
+        else:
+            self.log_panel.log_message(f"Queued {len(uploads)} file(s) for upload to {len(target_folders)} folders")
+        self._update_queue_status()
+    
+    def _dedup_options(self, file_paths):
+        """Upload options per file path that let the server copy content it already has
+        
+        Files without a known remote copy are left out.
+        """
+        files = []
+        for file_path in file_paths:
+            try:
+                local_stat = os.stat(file_path)
+            except OSError:
+                continue
+            files.append((file_path, local_stat.st_size, local_stat.st_mtime))
+        
+        # Only files hashed before (by an earlier upload) are looked up; nothing is hashed here
+        hashes, _ = self.db_manager.get_cached_hashes(files)
+        if not hashes:
+            return {}
+        
+        copies, _ = self.db_manager.find_remote_copies_batch(hashes.values())
+        return {
+            file_path: {"content_sha256": sha256, "copy_sources": copies[sha256]}
+            for file_path, sha256 in hashes.items()
+            if copies.get(sha256)
+        }
+    
+    @staticmethod
+    def _file_size(file_path):
+        """Size of a local file, or -1 if it can't be read"""
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return -1
+    
+    def _archive_batches(self, uploads):
+        """Split small-file uploads into archives of bounded count and size"""
+        batch = []
+        batch_bytes = 0
+        for file_path, target_folder in uploads:
+            size = self._file_size(file_path)
+            if batch and (len(batch) >= ARCHIVE_MAX_FILES or batch_bytes + size > ARCHIVE_MAX_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append((file_path, target_folder))
+            batch_bytes += size
+        if batch:
+            yield batch
+    
+    def _queue_row(self, item):
+        """Build the list row for a transfer item"""
+        state = item.state.capitalize()
+        if item.state == RUNNING:
+            state = f"{state} {format_progress(item.progress.snapshot())}"
+        return (item.file_name, item.folder_name, format_file_size(item.size), state)
+    
+    def _poll_transfer_queue(self):
+        """Apply transfer state changes on the Tk thread"""
+        try:
+            finished = []
+            for item in self.transfer_queue.poll_events():
+                self.queue_list.update_item(str(item.id), self._queue_row(item))
+                
+                if isinstance(item, ArchiveTransferItem):
+                    if item.state == DONE:
+                        self._on_archive_done(item)
+                    elif item.state == FAILED:
+                        self._on_archive_failed(item)
+                elif item.state == DONE:
+                    finished.append(item)
+                elif item.state == FAILED:
+                    self.log_panel.log_message(f"Error uploading {item.local_path}: {item.error}", "ERROR")
             
-            self.status_bar.set_status("File uploaded successfully")
-            self.log_panel.log_message(f"File uploaded successfully to {remote_file_path}")
-            messagebox.showinfo("Upload Result", f"File uploaded successfully to {remote_file_path}")
+            # Uploads finished since the last poll are recorded together
+            if finished:
+                self._record_uploads(finished)
+                for item in finished:
+                    self._on_upload_done(item)
             
-            # Call refresh callback if provided
-            if self.on_refresh_callback:
-                self.on_refresh_callback()
+            if self._queue_active:
+                idle = self.transfer_queue.is_idle()
                 
-        except Exception as e:
-            self.log_panel.log_message(f"Error during upload: {str(e)}", "ERROR")
-            self.status_bar.set_status("Upload failed")
-            messagebox.showerror("Upload Error", f"Error: {str(e)}")
\ No newline at end of file
+                # Redraw progress at most every PROGRESS_UPDATE_INTERVAL, but report the end right away
+                now = time.monotonic()
+                if idle or now - self._last_progress_update >= PROGRESS_UPDATE_INTERVAL:
+                    self._last_progress_update = now
+                    for item in self.transfer_queue.active():
+                        if item.state == RUNNING:
+                            self.queue_list.update_item(str(item.id), self._queue_row(item))
+                    self._update_queue_status()
+                
+                # Batched; writes at most once per journal flush interval
+                self._flush_journal(force=idle)
+                
+                if idle:
+                    self._queue_active = False
+                    
+                    # Call refresh callback if provided
+                    if self.on_refresh_callback:
+                        self.on_refresh_callback()
+        finally:
+            self.after(QUEUE_POLL_INTERVAL, self._poll_transfer_queue)
+    
+    def _record_uploads(self, items):
+        """Record finished uploads in the database with one bulk insert"""
+        success, error = self.db_manager.add_files([
+            (item.file_name, item.folder_name, item.local_path, item.result["path"], item.result["size"],
+             item.result["sha256"], item.result["remote_sha256"])
+            for item in items
+        ])
+        if not success:
+            self.log_panel.log_message(f"Database error for {len(items)} upload(s): {error}", "ERROR")
+        
+        # Remember the hashes so uploading these files again can be a server-side copy
+        self.db_manager.cache_hashes([
+            (item.local_path, item.result["size"], item.result["local_mtime"], item.result["sha256"])
+            for item in items
+        ])
+    
+    def _on_upload_done(self, item):
+        """Log a finished upload"""
+        remote_file_path = item.result["path"]
+        
+        if item.result["copied_from"]:
+            self.log_panel.log_message(
+                f"File copied on the server from {item.result['copied_from']} to {remote_file_path}"
+            )
+            return
+        
+        stats = format_transfer_stats(item.result["stats"])
+        if item.result["remote_sha256"]:
+            self.log_panel.log_message(f"File uploaded and verified (SHA-256) at {remote_file_path} ({stats})")
+        else:
+            self.log_panel.log_message(f"File uploaded successfully to {remote_file_path} (not verified, {stats})")
+    
+    def _on_archive_done(self, item):
+        """Record all files of an extracted archive with one bulk insert"""
+        results = item.result
+        
+        success, error = self.db_manager.add_files([
+            (os.path.basename(result["local_path"]), result["folder_name"], result["local_path"],
+             result["path"], result["size"], result["sha256"], result["remote_sha256"])
+            for result in results
+        ])
+        if not success:
+            self.log_panel.log_message(f"Database error for archive upload: {error}", "ERROR")
+        
+        self.db_manager.cache_hashes([
+            (result["local_path"], result["size"], result["local_mtime"], result["sha256"])
+            for result in results
+        ])
+        
+        verified = "verified" if all(result["remote_sha256"] for result in results) else "not verified"
+        self.log_panel.log_message(
+            f"Uploaded {len(results)} small files as one archive "
+            f"({verified}, {format_transfer_stats(item.progress.stats())})"
+        )
+    
+    def _on_archive_failed(self, item):
+        """Send the files of a failed archive one by one instead"""
+        self.log_panel.log_message(
+            f"Archive upload of {len(item.uploads)} files failed ({item.error}); uploading them individually",
+            "WARNING"
+        )
+        for file_path, target_folder in item.uploads:
+            retry = self.transfer_queue.add(file_path, target_folder)
+            self.queue_list.add_item(self._queue_row(retry), item_id=str(retry.id))
+        self._queue_active = True
+    
+    def _update_queue_status(self):
+        """Show queue progress in the status bar"""
+        counts = self.transfer_queue.counts()
+        finished = counts[DONE] + counts[FAILED]
+        total = finished + counts[QUEUED] + counts[RUNNING]
+        
+        if self.transfer_queue.is_idle():
+            message = f"Uploads finished: {counts[DONE]} succeeded, {counts[FAILED]} failed"
+        else:
+            # Bytes and ETA cover everything still queued, at the current combined rate
+            progress = combined_snapshot(item.progress for item in self.transfer_queue.active())
+            message = (
+                f"Uploading {counts[RUNNING]} file(s), {finished} of {total} finished"
+                f" - {format_progress(progress)}"
+            )
+        self.status_bar.set_status(message)
+    
+    def resume_transfers(self):
+        """Queue the uploads the journal still lists as unfinished"""
+        entries, error = self.journal.unfinished()
+        if error:
+            self.log_panel.log_message(f"Could not read the transfer journal: {error}", "ERROR")
+            return
+        if not entries:
+            return
+        
+        for entry in entries:
+            if entry["kind"] == "archive":
+                item = self.transfer_queue.add_archive(entry["uploads"], journal_id=entry["id"])
+            else:
+                item = self.transfer_queue.add(
+                    entry["local_path"], entry["folder_name"], journal_id=entry["id"], **entry["options"]
+                )
+            self.queue_list.add_item(self._queue_row(item), item_id=str(item.id))
+        
+        # Partial remote files are verified and continued by upload_file itself
+        self._queue_active = True
+        self.log_panel.log_message(f"Resuming {len(entries)} interrupted transfer(s)")
+        self._update_queue_status()
+    
+    def _flush_journal(self, force=False):
+        """Write pending transfer journal changes"""
+        success, error = self.journal.flush(force)
+        if not success:
+            self.log_panel.log_message(f"Could not update the transfer journal: {error}", "ERROR")
+    
+    def close(self):
+        """Stop background uploads and remote operations"""
+        self.transfer_queue.shutdown()
+        self.async_client.shutdown()
+        
+        # Whatever was queued or running stays in the journal for the next start
+        self._flush_journal(force=True)
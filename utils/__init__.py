@@ -1,2 +1,2 @@
-from .helpers import open_file_explorer, ensure_dir_exists, get_file_extension, is_valid_file_type
+from .helpers import open_file_explorer, ensure_dir_exists, scan_tree, get_file_extension, is_valid_file_type
 from .preview import preview_file, get_file_type
\ No newline at end of file
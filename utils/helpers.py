@@ -20,6 +20,32 @@ def ensure_dir_exists(directory):
         os.makedirs(directory)
     return os.path.exists(directory)
 
+def scan_tree(root):
+    """Walk a local directory tree with os.scandir
+    
+    Returns the relative paths of all subdirectories and a list of
+    (file_path, relative_dir) pairs, with "/" as separator and "" for the root.
+    Symlinked directories are not followed.
+    """
+    directories = []
+    files = []
+    pending = [("", root)]
+    
+    while pending:
+        relative_dir, directory = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                    directories.append(relative_path)
+                    pending.append((relative_path, entry.path))
+                elif entry.is_file():
+                    files.append((entry.path, relative_dir))
+    
+    directories.sort()
+    files.sort()
+    return directories, files
+
 def get_file_extension(file_path):
     """Get file extension from path"""
     return os.path.splitext(file_path)[1].lower()